@@ -0,0 +1,222 @@
+import asyncio
+import os
+import time
+from udp_node import UdpNode, CLEANUP_INTERVAL, WINDOW_SIZE
+from pending_message import PendingMessage
+from message_handler import MessageHandler
+from send_window import SendWindow
+from retransmit_queue import RetransmitQueue
+from delayed_ack import DelayedAcks
+from file_transfer import FileTransfer, FileReader
+from fec import ParityEncoder
+import messages
+
+# Versao do UdpNode movida a asyncio: um unico event loop faz o papel da thread de
+# escuta e das threads de heartbeat/limpeza/reenvio, entao da para rodar centenas de
+# nos logicos no mesmo processo (testes de carga). O protocolo e o MessageHandler sao
+# os mesmos do UdpNode.
+#
+#   node = AsyncUdpNode("A", 12000, "127.0.0.1", 12001)
+#   await node.start()
+#   ok = await node.talk("B", "oi")
+#   ok = await node.send_file("B", "testfile.txt")
+#   node.close()
+
+
+class AsyncSendWindow(SendWindow):
+    # mesma contabilidade da SendWindow, mas quem espera espaco na janela e uma corrotina
+    def __init__(self, msg_id, size):
+        super().__init__(msg_id, size)
+        self.changed = asyncio.Event()
+
+    async def acquire(self, seq):
+        while len(self.in_flight) >= self.size and not self.failed:
+            self.changed.clear()
+            await self.changed.wait()
+        if self.failed:
+            return False
+        self.in_flight.add(seq)
+        return True
+
+    def ack(self, cum_seq, ranges, bitmap=0):
+        acked = super().ack(cum_seq, ranges, bitmap)
+        if acked:
+            self.changed.set()
+        return acked
+
+    def fail(self):
+        super().fail()
+        self.changed.set()
+
+    async def wait_drained(self):
+        while self.in_flight and not self.failed:
+            self.changed.clear()
+            await self.changed.wait()
+        return not self.failed
+
+
+class _NodeProtocol(asyncio.DatagramProtocol):
+    def __init__(self, node):
+        self.node = node
+
+    def datagram_received(self, data, addr):
+        sender_ip, sender_port = addr
+        self.node.datagrams_received += 1
+        MessageHandler.handle_datagram(data, sender_ip, sender_port, self.node)
+
+    def error_received(self, exc):
+        #ex.: ICMP port unreachable de um destino que caiu; o reenvio/desistencia trata
+        pass
+
+
+class AsyncUdpNode(UdpNode):
+    def __init__(self, device_name, listen_port=11000, dest_ip="255.255.255.255", dest_port=11000, *, window_size=WINDOW_SIZE, wire_format="binary", mtu=None, fec=0, seeds=()):
+        super().__init__(device_name, listen_port, dest_ip, dest_port, window_size=window_size, wire_format=wire_format, mtu=mtu,
+                         fec=fec, seeds=seeds)
+        self.pending_messages = RetransmitQueue(on_earlier_deadline=self._wake_retransmit)
+        self.delayed_acks = DelayedAcks(on_earlier_deadline=self._wake_acks)
+        self.transport = None
+        self.tasks = []
+        self.retransmit_wakeup = None
+        self.ack_wakeup = None
+
+    async def start(self, heartbeat=True):
+        loop = asyncio.get_running_loop()
+        self.retransmit_wakeup = asyncio.Event()
+        self.ack_wakeup = asyncio.Event()
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: _NodeProtocol(self), sock=self.socket)
+        self.tasks.append(asyncio.create_task(self.retransmit_loop()))
+        self.tasks.append(asyncio.create_task(self.ack_loop()))
+        if heartbeat:
+            #mesmo destino de heartbeat do UdpNode.start: dest_ip na porta de escuta
+            listen_port = self.socket.getsockname()[1]
+            self.tasks.append(asyncio.create_task(self.heartbeat_loop(self.dest_ip, listen_port)))
+            self.tasks.append(asyncio.create_task(self.gossip_loop()))
+            self.tasks.append(asyncio.create_task(self._every(self.cleanup_inactive_devices, CLEANUP_INTERVAL)))
+
+    def close(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks.clear()
+        if self.transport:
+            self.transport.close()
+
+    def send_udp(self, message, dest_ip, dest_port):
+        if isinstance(message, str):
+            message = message.encode('utf-8')
+        self.transport.sendto(message, (dest_ip, dest_port))
+        self.last_sent[(dest_ip, dest_port)] = time.monotonic()
+        self.metrics.count_packet("out", message)
+
+    async def heartbeat_loop(self, dest_ip, listen_port):
+        while True:
+            await asyncio.sleep(self.heartbeat_tick(dest_ip, listen_port))
+
+    async def gossip_loop(self):
+        while True:
+            await asyncio.sleep(self.membership.tick())
+
+    async def retransmit_loop(self):
+        # dorme ate o proximo prazo de reenvio; acorda antes se entrar mensagem com prazo menor
+        while True:
+            self.resend_pending_messages(self.pending_messages.pop_due(time.monotonic()))
+            deadline = self.pending_messages.next_deadline()
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            self.retransmit_wakeup.clear()
+            try:
+                await asyncio.wait_for(self.retransmit_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def ack_loop(self):
+        # mesmo esquema do retransmit_loop, para os SACKs adiados
+        while True:
+            MessageHandler.flush_acks(self.delayed_acks.pop_due(time.monotonic()), self)
+            deadline = self.delayed_acks.next_deadline()
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            self.ack_wakeup.clear()
+            try:
+                await asyncio.wait_for(self.ack_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def talk(self, target_name, content):
+        # retorna True quando o ACK chega, False se o destino nao existe ou nao respondeu
+        info = self._find_device(target_name)
+        if not info:
+            return False
+        msg_id = self._generate_message_id()
+        msg = f"TALK msg{msg_id} {content}"
+        pm = PendingMessage((msg_id, messages.MESSAGE), msg, info.ip, info.port, self._rtt_estimator(info.ip, info.port))
+        done = self._track(pm)
+        self.send_udp(msg, info.ip, info.port)
+        return await done
+
+    async def send_file(self, target_name, file_path, chunk_size=None):
+        # retorna True quando o receptor confirma o END (hash conferido)
+        info = self._find_device(target_name)
+        if not info:
+            return False
+        if not os.path.isfile(file_path):
+            print("[ERRO] Arquivo não encontrado:", file_path)
+            return False
+
+        msg_id = self._generate_message_id()
+        binary = self._use_binary(info)
+        digest = self.digest if info.wire_version >= 2 else "md5"
+        transfer = FileTransfer(msg_id, file_path, binary, self._chunk_size_for(info, binary, chunk_size),
+                                digest=digest, chunk_crc=info.wire_version >= 2, fec=self.fec if info.wire_version >= 4 else 0)
+
+        header = transfer.header()
+        rtt = self._rtt_estimator(info.ip, info.port)
+        self.pending_messages[(msg_id, messages.MESSAGE)] = PendingMessage((msg_id, messages.MESSAGE), header, info.ip, info.port, rtt)
+        self.send_udp(header, info.ip, info.port)
+
+        window = AsyncSendWindow(msg_id, self.window_size)
+        self.send_windows[msg_id] = window
+        try:
+            reader = FileReader(file_path, transfer.chunk_size, digest)
+            encoder = ParityEncoder(transfer.fec, -(-transfer.file_size // transfer.chunk_size)) if transfer.fec else None
+            for seq, chunk in reader.chunks():
+                if not await window.acquire(seq):
+                    break
+                chunk_id, chunk_msg = transfer.encode_chunk(seq, chunk)
+                self.pending_messages[chunk_id] = PendingMessage(chunk_id, chunk_msg, info.ip, info.port, rtt)
+                self.send_udp(chunk_msg, info.ip, info.port)
+                block = encoder.add(seq, chunk) if encoder else None
+                if block:
+                    self.send_udp(transfer.encode_parity(*block), info.ip, info.port)
+
+            if not await window.wait_drained():
+                self._abort_transfer(window)
+                self.metrics.inc("transfers", "falha")
+                return False
+        finally:
+            del self.send_windows[msg_id]
+
+        end_id, end_msg = transfer.end_message(reader.hexdigest())
+        done = self._track(PendingMessage(end_id, end_msg, info.ip, info.port, rtt))
+        self.send_udp(end_msg, info.ip, info.port)
+        ok = await done
+        self.metrics.inc("transfers", "ok" if ok else "falha")
+        return ok
+
+    def _track(self, pm):
+        # registra a mensagem pendente e devolve um future resolvido no ACK ou na desistencia
+        done = asyncio.get_running_loop().create_future()
+        pm.on_done = lambda acknowledged: done.done() or done.set_result(acknowledged)
+        self.pending_messages[pm.id] = pm
+        return done
+
+    def _wake_retransmit(self):
+        if self.retransmit_wakeup:
+            self.retransmit_wakeup.set()
+
+    def _wake_acks(self):
+        if self.ack_wakeup:
+            self.ack_wakeup.set()
+
+    async def _every(self, func, interval):
+        while True:
+            func()
+            await asyncio.sleep(interval)
@@ -0,0 +1,169 @@
+import ctypes
+import ctypes.util
+import errno
+import socket
+import struct
+import sys
+
+# Recepcao/envio em lote: no Linux usa recvmmsg/sendmmsg (varios datagramas por
+# syscall) via ctypes; nos outros sistemas cai para recvfrom_into/sendto.
+# Os datagramas recebidos sao memoryviews sobre um buffer reaproveitado: valem so
+# ate a proxima chamada de recv() (quem precisar guardar faz bytes(...)).
+
+MSG_WAITFORONE = 0x10000
+
+
+class _IoVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _SockAddrIn(ctypes.Structure):
+    _fields_ = [("sin_family", ctypes.c_ushort), ("sin_port", ctypes.c_uint16),
+                ("sin_addr", ctypes.c_uint8 * 4), ("sin_zero", ctypes.c_uint8 * 8)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [("msg_name", ctypes.c_void_p), ("msg_namelen", ctypes.c_uint32),
+                ("msg_iov", ctypes.POINTER(_IoVec)), ("msg_iovlen", ctypes.c_size_t),
+                ("msg_control", ctypes.c_void_p), ("msg_controllen", ctypes.c_size_t),
+                ("msg_flags", ctypes.c_int)]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.recvmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+        libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+HAVE_MMSG = _libc is not None
+
+
+_SOCKADDR_SIZE = ctypes.sizeof(_SockAddrIn)
+_MMSG_SIZE = ctypes.sizeof(_MMsgHdr)
+_IOVEC_SIZE = ctypes.sizeof(_IoVec)
+# campos lidos/escritos direto na memoria dos vetores: acessar campo a campo via ctypes
+# custa mais do que a syscall que se quer economizar
+_MSG_LEN = struct.Struct(f"={_MMsgHdr.msg_len.offset}xI{_MMSG_SIZE - _MMsgHdr.msg_len.offset - 4}x")
+_SOCKADDR = struct.Struct("=H")  #sin_family (ordem do host); porta e IP vao em ordem de rede
+_SOCKADDR_PORT_IP = struct.Struct("!2xH4s8x")
+_IOV_LEN = struct.Struct("@N")  #size_t
+
+
+def _pack_sockaddr(ip, port):
+    return _SOCKADDR.pack(socket.AF_INET) + struct.pack("!H", port) + socket.inet_aton(ip) + bytes(8)
+
+
+def _link_vectors(msgs, iovecs, addrs, base, bufsize, count):
+    # cada mmsghdr aponta para seu iovec (fatia de `bufsize` do buffer) e seu sockaddr
+    for i in range(count):
+        iovecs[i].iov_base = base + i * bufsize
+        iovecs[i].iov_len = bufsize
+        hdr = msgs[i].msg_hdr
+        hdr.msg_name = ctypes.addressof(addrs[i])
+        hdr.msg_namelen = _SOCKADDR_SIZE
+        hdr.msg_iov = ctypes.pointer(iovecs[i])
+        hdr.msg_iovlen = 1
+
+
+class BatchReceiver:
+    def __init__(self, sock, batch=32, bufsize=65535, use_mmsg=HAVE_MMSG):
+        self.sock = sock
+        self.batch = batch
+        self.bufsize = bufsize
+        self.use_mmsg = use_mmsg and HAVE_MMSG
+        self.buffer = bytearray(batch * bufsize if self.use_mmsg else bufsize)
+        self.view = memoryview(self.buffer)
+        if self.use_mmsg:
+            base = ctypes.addressof((ctypes.c_char * len(self.buffer)).from_buffer(self.buffer))
+            self.msgs = (_MMsgHdr * batch)()
+            self.iovecs = (_IoVec * batch)()
+            self.addrs = (_SockAddrIn * batch)()
+            _link_vectors(self.msgs, self.iovecs, self.addrs, base, bufsize, batch)
+            self.msgs_view = memoryview(self.msgs).cast("B")
+            self.addrs_view = memoryview(self.addrs).cast("B")
+            self.ips = {}  #cache de IP empacotado -> string
+
+    def recv(self):
+        # bloqueia ate chegar pelo menos um datagrama; retorna [(memoryview, (ip, porta)), ...]
+        if not self.use_mmsg:
+            nbytes, addr = self.sock.recvfrom_into(self.buffer)
+            return [(self.view[:nbytes], addr)]
+        while True:
+            count = _libc.recvmmsg(self.sock.fileno(), ctypes.addressof(self.msgs), self.batch, MSG_WAITFORONE, None)
+            if count >= 0:
+                break
+            err = ctypes.get_errno()
+            if err != errno.EINTR:
+                raise OSError(err, "recvmmsg: " + errno.errorcode.get(err, str(err)))
+        lengths = _MSG_LEN.iter_unpack(self.msgs_view[:count * _MMSG_SIZE])
+        addrs = _SOCKADDR_PORT_IP.iter_unpack(self.addrs_view[:count * _SOCKADDR_SIZE])
+        received = []
+        start = 0
+        for (length,), (port, packed_ip) in zip(lengths, addrs):
+            ip = self.ips.get(packed_ip)
+            if ip is None:
+                ip = self.ips[packed_ip] = socket.inet_ntoa(packed_ip)
+            received.append((self.view[start:start + length], (ip, port)))
+            start += self.bufsize
+        for i in range(count):
+            self.msgs[i].msg_hdr.msg_namelen = _SOCKADDR_SIZE  #o kernel sobrescreve
+        return received
+
+
+class BatchSender:
+    # copia os datagramas para um buffer fixo e manda ate `batch` por sendmmsg
+    def __init__(self, sock, batch=32, bufsize=65535, use_mmsg=HAVE_MMSG):
+        self.sock = sock
+        self.batch = batch
+        self.bufsize = bufsize
+        self.use_mmsg = use_mmsg and HAVE_MMSG
+        if self.use_mmsg:
+            self.buffer = bytearray(batch * bufsize)
+            base = ctypes.addressof((ctypes.c_char * len(self.buffer)).from_buffer(self.buffer))
+            self.msgs = (_MMsgHdr * batch)()
+            self.iovecs = (_IoVec * batch)()
+            self.addrs = (_SockAddrIn * batch)()
+            _link_vectors(self.msgs, self.iovecs, self.addrs, base, bufsize, batch)
+            self.iovecs_view = memoryview(self.iovecs).cast("B")
+            self.addrs_view = memoryview(self.addrs).cast("B")
+            self.sockaddrs = {}  #cache (ip, porta) -> sockaddr_in empacotado
+
+    def send(self, messages):
+        # messages: [(bytes, (ip, porta)), ...]
+        if not self.use_mmsg or len(messages) == 1:
+            for data, addr in messages:
+                self.sock.sendto(data, addr)
+            return
+        for first in range(0, len(messages), self.batch):
+            self._send_batch(messages[first:first + self.batch])
+
+    def _send_batch(self, messages):
+        for i, (data, addr) in enumerate(messages):
+            start = i * self.bufsize
+            self.buffer[start:start + len(data)] = data
+            _IOV_LEN.pack_into(self.iovecs_view, i * _IOVEC_SIZE + _IoVec.iov_len.offset, len(data))
+            sockaddr = self.sockaddrs.get(addr)
+            if sockaddr is None:
+                sockaddr = self.sockaddrs[addr] = _pack_sockaddr(*addr)
+            self.addrs_view[i * _SOCKADDR_SIZE:(i + 1) * _SOCKADDR_SIZE] = sockaddr
+        count = len(messages)
+        sent = 0
+        while sent < count:
+            result = _libc.sendmmsg(self.sock.fileno(), ctypes.addressof(self.msgs) + sent * _MMSG_SIZE, count - sent, 0)
+            if result < 0:
+                err = ctypes.get_errno()
+                if err == errno.EINTR:
+                    continue
+                raise OSError(err, "sendmmsg: " + errno.errorcode.get(err, str(err)))
+            sent += result
@@ -0,0 +1,71 @@
+# Custo de CPU por datagrama do batch_io com e sem recvmmsg/sendmmsg.
+#
+# Uso: python benchmarks/bench_batch_io.py [--packets 100000] [--size 1000]
+import argparse
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import batch_io
+
+
+def bench_send(use_mmsg, packets, size):
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender = batch_io.BatchSender(sock, use_mmsg=use_mmsg)
+    batch = [(b"z" * size, sink.getsockname())] * sender.batch
+    start = time.process_time()
+    for _ in range(packets // len(batch)):
+        sender.send(batch)
+    cpu = time.process_time() - start
+    sock.close()
+    sink.close()
+    return cpu, packets // len(batch)
+
+
+def bench_recv(use_mmsg, packets, size):
+    # mede o esvaziamento de uma fila cheia, que e quando o receptor esta atrasado
+    # e o lote faz diferenca (com o receptor ocioso cada recvmmsg volta com 1 datagrama)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    source = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver = batch_io.BatchReceiver(sock, use_mmsg=use_mmsg)
+    round_size = min(packets, 1000)
+    cpu = 0
+    calls = 0
+    for _ in range(packets // round_size):
+        for _ in range(round_size):
+            source.sendto(b"z" * size, sock.getsockname())
+        start = time.process_time()
+        received = 0
+        while received < round_size:
+            received += len(receiver.recv())
+            calls += 1
+        cpu += time.process_time() - start
+    source.close()
+    sock.close()
+    return cpu, calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de recvmmsg/sendmmsg")
+    parser.add_argument("--packets", type=int, default=100000)
+    parser.add_argument("--size", type=int, default=1000)
+    args = parser.parse_args()
+
+    modes = [False, True] if batch_io.HAVE_MMSG else [False]
+    print(f"{'lado':<6} {'modo':<9} {'syscalls':>9} {'us CPU/datagrama':>17}")
+    for side, bench in (("envio", bench_send), ("recv", bench_recv)):
+        for use_mmsg in modes:
+            cpu, calls = bench(use_mmsg, args.packets, args.size)
+            mode = "mmsg" if use_mmsg else "simples"
+            calls = calls if use_mmsg or side == "recv" else args.packets
+            print(f"{side:<6} {mode:<9} {calls:>9} {cpu * 1e6 / args.packets:>17.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# Vazao de send_file entre dois UdpNode em 127.0.0.1 para varios tamanhos de CHUNK.
+#
+# Uso: python benchmarks/bench_chunk_size.py [--mb 32] [--wire binary|text]
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from udp_node import UdpNode
+from device_info import DeviceInfo
+import wire
+
+CHUNK_SIZES = [512, 1024, 1452, 4096, 8192, 16384, 32768, 65487]
+
+
+def wait_for(path, timeout):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return os.path.exists(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de vazão por tamanho de CHUNK")
+    parser.add_argument("--mb", type=int, default=32, help="Tamanho do arquivo em MB")
+    parser.add_argument("--wire", choices=["binary", "text"], default="binary")
+    parser.add_argument("--port", type=int, default=15000, help="Primeira porta usada (usa duas)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_chunk_")
+    os.chdir(workdir)  #o receptor grava recv_<arquivo> no diretorio atual
+    with open("payload.bin", "wb") as f:
+        f.write(os.urandom(args.mb * 1024 * 1024))
+
+    sender = UdpNode("sender", args.port, "127.0.0.1", args.port + 1, wire_format=args.wire)
+    receiver = UdpNode("receiver", args.port + 1, "127.0.0.1", args.port, wire_format=args.wire)
+    for node in (sender, receiver):
+        node.start_services("127.0.0.1", 0, heartbeat=False)
+    sender.active_devices["receiver"] = DeviceInfo("receiver", "127.0.0.1", args.port + 1, wire.WIRE_VERSION)
+
+    print(f"{'chunk':>6} {'datagramas':>11} {'MB/s':>8}")
+    for chunk_size in CHUNK_SIZES:
+        if args.wire == "text" and chunk_size > 48000:
+            continue  #base64 de 64K nao cabe num datagrama
+        with contextlib.suppress(FileNotFoundError):
+            os.remove("recv_payload.bin")
+        start = time.monotonic()
+        with contextlib.redirect_stdout(io.StringIO()):
+            sender.send_file("receiver", "payload.bin", chunk_size=chunk_size)
+            ok = wait_for("recv_payload.bin", 60)
+        elapsed = time.monotonic() - start
+        datagrams = -(-args.mb * 1024 * 1024 // chunk_size)
+        print(f"{chunk_size:>6} {datagrams:>11} {args.mb / elapsed if ok else 0:>8.1f}")
+    shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# Compressao por CHUNK: taxa de compressao x CPU para cada codec e nivel, e o efeito
+# num send_file entre dois UdpNode em 127.0.0.1 com a banda limitada (--rate).
+#
+# Sem --file usa um log sintetico (o tipo de arquivo que mais trafega); com --file
+# mede o arquivo dado.
+#
+# Uso: python benchmarks/bench_compression.py [--file testfile.txt] [--chunk 1452] [--rate 20000000]
+import argparse
+import contextlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from udp_node import UdpNode
+from device_info import DeviceInfo
+from token_bucket import TokenBucket
+import compression
+import wire
+
+LEVELS = {"zlib": [1, 6, 9], "lzma": [0, 1, 6]}
+
+
+def synthetic_log(size):
+    rng = random.Random(1)
+    levels = ["INFO", "INFO", "INFO", "DEBUG", "WARN", "ERROR"]
+    lines, total = [], 0
+    while total < size:
+        line = (f"2026-10-17 12:{rng.randrange(60):02d}:{rng.randrange(60):02d}.{rng.randrange(1000):03d} "
+                f"{rng.choice(levels):<5} worker-{rng.randrange(16)} request id={rng.getrandbits(32):08x} "
+                f"from 10.0.{rng.randrange(256)}.{rng.randrange(256)} took {rng.expovariate(0.05):.1f} ms\n")
+        lines.append(line)
+        total += len(line)
+    return "".join(lines).encode()[:size]
+
+
+def bench_codec(data, chunk_size, codec, level):
+    compressor = compression.Compressor(codec, level)
+    chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+    start = time.process_time()
+    packed = [compressor.compress(chunk) for chunk in chunks]
+    compress_time = time.process_time() - start
+    start = time.process_time()
+    for chunk, p in zip(chunks, packed):
+        if p is not None:
+            compression.decompress(codec, p, chunk_size)
+    decompress_time = time.process_time() - start
+    sent = sum(len(p) if p is not None else len(c) for c, p in zip(chunks, packed))
+    mb = len(data) / 1024 / 1024
+    return sent / len(data), mb / compress_time, mb / decompress_time
+
+
+def transfer(path, codec, level, chunk_size, rate, port):
+    sender = UdpNode("sender", port, "127.0.0.1", port + 1, compression_codec=codec, compression_level=level)
+    receiver = UdpNode("receiver", port + 1, "127.0.0.1", port)
+    for node in (sender, receiver):
+        node.start_services("127.0.0.1", 0, heartbeat=False)
+    info = DeviceInfo("receiver", "127.0.0.1", port + 1, wire.WIRE_VERSION)
+    info.codecs = compression.SUPPORTED
+    sender.active_devices["receiver"] = info
+    bucket = TokenBucket(rate)
+    received = "recv_" + os.path.basename(path)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(received)
+    wall, cpu = time.monotonic(), time.process_time()
+    sender.send_file_multi(["receiver"], path, chunk_size, pace=lambda info, nbytes: bucket.consume(nbytes))
+    while not os.path.exists(received):
+        time.sleep(0.002)
+    return time.monotonic() - wall, time.process_time() - cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de compressão por CHUNK")
+    parser.add_argument("--file", help="Arquivo a medir (padrão: log sintético)")
+    parser.add_argument("--mb", type=int, default=8, help="Tamanho do log sintético em MB")
+    parser.add_argument("--chunk", type=int, default=1452, help="Tamanho do CHUNK (1452 = Ethernet 1500)")
+    parser.add_argument("--rate", type=int, default=20_000_000, help="Banda do envio em bytes/s (0 = sem limite)")
+    parser.add_argument("--port", type=int, default=15100, help="Primeira porta usada (usa duas por envio)")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "rb") as f:
+            data = f.read()
+    else:
+        data = synthetic_log(args.mb * 1024 * 1024)
+
+    print(f"{len(data)} bytes, CHUNK de {args.chunk} bytes")
+    print(f"{'codec':>5} {'nível':>5} {'enviado':>8} {'comp MB/s':>10} {'desc MB/s':>10}")
+    for codec, levels in LEVELS.items():
+        for level in levels:
+            ratio, comp_rate, decomp_rate = bench_codec(data, args.chunk, codec, level)
+            print(f"{codec:>5} {level:>5} {ratio:>8.1%} {comp_rate:>10.1f} {decomp_rate:>10.1f}")
+
+    workdir = tempfile.mkdtemp(prefix="bench_comp_")
+    cwd = os.getcwd()
+    os.chdir(workdir)  #o receptor grava recv_<arquivo> no diretorio atual
+    with open("payload.log", "wb") as f:
+        f.write(data)
+    print()
+    print(f"send_file a {args.rate / 1e6:g} MB/s" if args.rate else "send_file sem limite de banda")
+    print(f"{'codec':>5} {'nível':>5} {'MB/s':>8} {'CPU s':>7}")
+    port = args.port
+    out = sys.stdout
+    try:
+        #os nos continuam imprimindo (ACKs atrasados) depois de cada envio: silencia a parte toda
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for codec, level in [(None, None), ("zlib", 1), ("zlib", 6), ("lzma", 1)]:
+                wall, cpu = transfer("payload.log", codec, level, args.chunk, args.rate, port)
+                port += 2
+                print(f"{codec or '-':>5} {level if level is not None else '-':>5} {len(data) / 1024 / 1024 / wall:>8.1f} {cpu:>7.2f}",
+                      file=out, flush=True)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# Vazao dos hashes de arquivo inteiro (digest= no FILE, conferido no END) e do crc32 por
+# CHUNK, alimentados CHUNK a CHUNK como no envio e no recebimento.
+#
+# Numa maquina com instrucoes SHA (x86 SHA-NI, ARMv8) o sha256 passa do md5; sem elas
+# o md5 e o blake2b ganham. Rode aqui antes de trocar o --digest padrao.
+#
+# Uso: python benchmarks/bench_digest.py [--mb 64] [--chunk 1452]
+import argparse
+import hashlib
+import os
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from file_transfer import DIGESTS
+
+
+def bench_digest(name, chunks):
+    hasher = hashlib.new(name)
+    start = time.perf_counter()
+    for chunk in chunks:
+        hasher.update(chunk)
+    hasher.hexdigest()
+    return time.perf_counter() - start
+
+
+def bench_crc(chunks):
+    start = time.perf_counter()
+    for chunk in chunks:
+        zlib.crc32(chunk)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos hashes de integridade")
+    parser.add_argument("--mb", type=int, default=64, help="Dados por medida em MB")
+    parser.add_argument("--chunk", type=int, default=1452, help="Tamanho do CHUNK (1452 = Ethernet 1500)")
+    args = parser.parse_args()
+
+    data = os.urandom(args.mb * 1024 * 1024)
+    chunks = [data[i:i + args.chunk] for i in range(0, len(data), args.chunk)]
+    print(f"{len(data)} bytes em CHUNKs de {args.chunk} bytes")
+    print(f"{'hash':>8} {'MB/s':>8}")
+    for name in DIGESTS:
+        print(f"{name:>8} {args.mb / bench_digest(name, chunks):>8.0f}")
+    print(f"{'crc32':>8} {args.mb / bench_crc(chunks):>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
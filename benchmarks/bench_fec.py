@@ -0,0 +1,81 @@
+# Ganho do FEC (--fec K) com perda: send_file pelo LossProxy com e sem PARITY, de 1% a 5%.
+# Sem FEC cada CHUNK perdido espera o timeout de reenvio (RTO); com FEC a perda isolada num
+# bloco de K e reconstruida quando chega a paridade, sem ida e volta. Em troca vai 1/K a mais
+# de pacotes. Cada linha e a mediana de --rounds envios (cada um com outra semente de perda).
+#
+# Uso: python benchmarks/bench_fec.py [--losses 0.01,0.02,0.05] [--fec 0,4,8,16] [--size 4096]
+import argparse
+import contextlib
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from udp_node import UdpNode
+from device_info import DeviceInfo
+from loss_proxy import LossProxy
+from bench_load import LOCALHOST, port_of, measure, send_and_wait, summary
+import wire
+
+
+def run(args, loss, fec, path, seed):
+    a = UdpNode("A", 0, LOCALHOST, 0, mtu=args.mtu, max_transfers=1, fec=fec)
+    b = UdpNode("B", 0, LOCALHOST, 0, mtu=args.mtu, max_transfers=1)
+    for node in (a, b):
+        node.start_services(LOCALHOST, 0, heartbeat=False)
+    proxy = LossProxy((LOCALHOST, port_of(a)), (LOCALHOST, port_of(b)), loss=loss,
+                      delay=args.delay_ms / 1000, jitter=args.jitter_ms / 1000, seed=seed)
+    proxy.start()
+    a.active_devices["B"] = DeviceInfo("B", LOCALHOST, proxy.port_a, wire.WIRE_VERSION)
+    b.active_devices["A"] = DeviceInfo("A", LOCALHOST, proxy.port_b, wire.WIRE_VERSION)
+    ok, wall, cpu = measure(lambda: send_and_wait(a, path, args.timeout))
+    proxy.stop()
+    return {"ok": ok, "wall_s": wall, "cpu_s": cpu, "retransmissions": a.retransmissions,
+            "parity_sent": a.metrics.counters["packets_out"].get("PARITY", 0),
+            "recovered": b.metrics.counters["fec"].get("recuperado", 0)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do FEC com perda no LossProxy")
+    parser.add_argument("--losses", default="0.01,0.02,0.03,0.05", help="Probabilidades de descarte, separadas por vírgula")
+    parser.add_argument("--fec", default="0,4,8,16", help="Valores de --fec a comparar (0 = sem FEC)")
+    parser.add_argument("--size", type=int, default=4096, help="Tamanho do arquivo em KB")
+    parser.add_argument("--rounds", type=int, default=3, help="Envios por combinação (mediana)")
+    parser.add_argument("--mtu", type=int, default=1500, help="MTU usado para o tamanho do CHUNK")
+    parser.add_argument("--delay-ms", type=float, default=1.0, help="Atraso fixo no proxy")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Atraso aleatório extra no proxy (reordena)")
+    parser.add_argument("--timeout", type=float, default=120, help="Tempo máximo por envio em segundos")
+    args = parser.parse_args()
+
+    out = sys.stdout
+    workdir = tempfile.mkdtemp(prefix="bench_fec_")
+    cwd = os.getcwd()
+    os.chdir(workdir)  #o receptor grava recv_<arquivo> no diretorio atual
+    try:
+        path = f"payload_{args.size}k.bin"
+        with open(path, "wb") as f:
+            f.write(os.urandom(args.size * 1024))
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for loss in map(float, args.losses.split(",")):
+                baseline = None
+                for fec in map(int, args.fec.split(",")):
+                    runs = [run(args, loss, fec, path, seed) for seed in range(1, args.rounds + 1)]
+                    wall = statistics.median(r["wall_s"] for r in runs)
+                    result = {"loss": loss, "fec": fec, "ok": all(r["ok"] for r in runs), "wall_s": wall,
+                              "mb_per_s": args.size / 1024 / wall}
+                    for key in ("cpu_s", "retransmissions", "parity_sent", "recovered"):
+                        result[key] = statistics.median(r[key] for r in runs)
+                    if baseline is None:
+                        baseline = wall
+                    result["speedup"] = baseline / wall
+                    print(summary("fec", result), file=out, flush=True)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+# Teste de carga em 127.0.0.1: varios UdpNode no mesmo processo, cada um na sua porta.
+#
+# Cenarios:
+#   talk        - TALKs em sequencia, latencia ida e volta (p50/p99)
+#   talk_lossy  - o mesmo passando pelo LossProxy (perda, duplicacao, atraso/reordenacao)
+#   file        - send_file de arquivos de tamanhos crescentes (MB/s)
+#   file_lossy  - send_file pelo LossProxy (--corrupt tambem corrompe bits dos CHUNKs)
+#   heartbeat   - tempestade de HEARTBEATs de muitos dispositivos para um no
+#
+# Cada resultado traz tempo de CPU do processo e retransmissoes dos nos. --json grava
+# tudo num arquivo (ou "-" para a saida padrao) para comparar entre versoes.
+#
+# Uso: python benchmarks/bench_load.py [--scenarios talk,file] [--json resultados.json]
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from udp_node import UdpNode
+from device_info import DeviceInfo
+from loss_proxy import LossProxy
+import wire
+
+SCENARIOS = ["talk", "talk_lossy", "file", "file_lossy", "heartbeat"]
+LOCALHOST = "127.0.0.1"
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, round(p / 100 * (len(values) - 1)))]
+
+
+def port_of(node):
+    return node.socket.getsockname()[1]
+
+
+def make_pair(args, impair=None):
+    # dois nos "A" e "B" ja cadastrados um no outro; com impair (kwargs do LossProxy) passam pelo proxy
+    a = UdpNode("A", 0, LOCALHOST, 0, wire_format=args.wire, mtu=args.mtu, max_transfers=1, workers=args.workers)
+    b = UdpNode("B", 0, LOCALHOST, 0, wire_format=args.wire, mtu=args.mtu, max_transfers=1, workers=args.workers)
+    for node in (a, b):
+        node.start_services(LOCALHOST, 0, heartbeat=False)
+    proxy = None
+    port_for_a, port_for_b = port_of(b), port_of(a)
+    if impair:
+        proxy = LossProxy((LOCALHOST, port_of(a)), (LOCALHOST, port_of(b)), **impair)
+        proxy.start()
+        port_for_a, port_for_b = proxy.port_a, proxy.port_b
+    a.active_devices["B"] = DeviceInfo("B", LOCALHOST, port_for_a, wire.WIRE_VERSION)
+    b.active_devices["A"] = DeviceInfo("A", LOCALHOST, port_for_b, wire.WIRE_VERSION)
+    return a, b, proxy
+
+
+def measure(func):
+    # roda func() e devolve (resultado, segundos de relogio, segundos de CPU do processo)
+    wall, cpu = time.perf_counter(), time.process_time()
+    result = func()
+    return result, time.perf_counter() - wall, time.process_time() - cpu
+
+
+def finish(a, b, proxy):
+    stats = {"retransmissions": a.retransmissions + b.retransmissions}
+    if proxy:
+        proxy.stop()
+        stats["proxy"] = dict(proxy.stats)
+    return stats
+
+
+def talk_once(node, target, text, timeout):
+    # latencia em segundos ate o ACK, ou None se nao foi confirmada
+    done = threading.Event()
+    outcome = []
+    start = time.perf_counter()
+    node.send_talk(target, text, on_done=lambda ok: (outcome.append(ok), done.set()))
+    done.wait(timeout)
+    return time.perf_counter() - start if outcome and outcome[0] else None
+
+
+def run_talk(args, impair=None):
+    a, b, proxy = make_pair(args, impair)
+
+    def body():
+        return [talk_once(a, "B", f"ping {i}", args.timeout) for i in range(args.talks)]
+
+    latencies, wall, cpu = measure(body)
+    ok = [lat for lat in latencies if lat is not None]
+    result = {"count": args.talks, "failed": args.talks - len(ok), "wall_s": wall, "cpu_s": cpu,
+              "msgs_per_s": len(ok) / wall if wall else 0,
+              "p50_ms": 1000 * percentile(ok, 50) if ok else None,
+              "p99_ms": 1000 * percentile(ok, 99) if ok else None,
+              "max_ms": 1000 * max(ok) if ok else None}
+    result.update(finish(a, b, proxy))
+    return [result]
+
+
+def wait_for(path, timeout):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.002)
+    return os.path.exists(path)
+
+
+def send_and_wait(a, path, timeout):
+    # o receptor so renomeia recv_<arquivo> depois do END com hash certo
+    received = f"recv_{os.path.basename(path)}"
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(received)
+    return a.send_file("B", path) and wait_for(received, timeout)
+
+
+def run_file(args, sizes_kb, impair=None):
+    a, b, proxy = make_pair(args, impair)
+    results = []
+    for size_kb in sizes_kb:
+        path = f"payload_{size_kb}k.bin"
+        with open(path, "wb") as f:
+            f.write(os.urandom(size_kb * 1024))
+        retransmissions = a.retransmissions + b.retransmissions
+        ok, wall, cpu = measure(lambda: send_and_wait(a, path, args.timeout))
+        results.append({"size_kb": size_kb, "ok": ok, "wall_s": wall, "cpu_s": cpu,
+                        "mb_per_s": size_kb / 1024 / wall if ok else 0,
+                        "retransmissions": a.retransmissions + b.retransmissions - retransmissions})
+        os.remove(path)
+    stats = finish(a, b, proxy)
+    if proxy:
+        results[-1]["proxy"] = stats["proxy"]
+    return results
+
+
+def run_heartbeat(args):
+    observer = UdpNode("observer", 0, LOCALHOST, 0, max_transfers=1)
+    observer.start_services(LOCALHOST, 0, heartbeat=False)
+    port = port_of(observer)
+    #os dispositivos so mandam: nao precisam de threads de escuta
+    devices = [UdpNode(f"dev{i}", 0, LOCALHOST, port, max_transfers=1) for i in range(args.devices)]
+    expected = args.devices * args.rounds
+
+    def body():
+        for _ in range(args.rounds):
+            for device in devices:
+                device.send_heartbeat(LOCALHOST, port)
+        #espera o observador processar tudo (ou parar de receber: o kernel pode ter descartado)
+        last, idle_since = -1, time.monotonic()
+        while observer.datagrams_received < expected and time.monotonic() - idle_since < 0.5:
+            if observer.datagrams_received != last:
+                last, idle_since = observer.datagrams_received, time.monotonic()
+            time.sleep(0.002)
+        return observer.datagrams_received
+
+    received, wall, cpu = measure(body)
+    for device in devices:
+        device.socket.close()
+    return [{"devices": args.devices, "sent": expected, "received": received,
+             "devices_seen": len(observer.active_devices), "wall_s": wall, "cpu_s": cpu,
+             "heartbeats_per_s": received / wall if wall else 0,
+             "cpu_us_per_heartbeat": 1e6 * cpu / received if received else None}]
+
+
+def summary(name, result):
+    fields = []
+    for key, value in result.items():
+        if isinstance(value, float):
+            value = f"{value:.3f}" if value < 100 else f"{value:.0f}"
+        fields.append(f"{key}={value}")
+    return f"{name:<11} " + " ".join(fields)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga de UdpNode em loopback")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Cenários separados por vírgula")
+    parser.add_argument("--wire", choices=["binary", "text"], default="binary")
+    parser.add_argument("--mtu", type=int, help="MTU usado para o tamanho do CHUNK (padrão: o do loopback)")
+    parser.add_argument("--workers", type=int, default=0, help="--workers dos nós (pipeline em etapas)")
+    parser.add_argument("--talks", type=int, default=1000, help="TALKs por cenário de talk")
+    parser.add_argument("--sizes", default="64,1024,8192,32768", help="Tamanhos de arquivo em KB")
+    parser.add_argument("--lossy-size", type=int, default=4096, help="Tamanho do arquivo em KB no file_lossy")
+    parser.add_argument("--devices", type=int, default=100, help="Dispositivos na tempestade de HEARTBEAT")
+    parser.add_argument("--rounds", type=int, default=50, help="HEARTBEATs por dispositivo")
+    parser.add_argument("--loss", type=float, default=0.02, help="Probabilidade de descarte no proxy")
+    parser.add_argument("--dup", type=float, default=0.01, help="Probabilidade de duplicação no proxy")
+    parser.add_argument("--corrupt", type=float, default=0.0, help="Probabilidade de corromper um bit de um CHUNK (binário ou texto com crc=) no proxy")
+    parser.add_argument("--delay-ms", type=float, default=1.0, help="Atraso fixo no proxy")
+    parser.add_argument("--jitter-ms", type=float, default=2.0, help="Atraso aleatório extra no proxy (reordena)")
+    parser.add_argument("--seed", type=int, default=1, help="Semente do proxy, para repetir a mesma sequência de perdas")
+    parser.add_argument("--timeout", type=float, default=60, help="Tempo máximo por operação em segundos")
+    parser.add_argument("--json", help="Grava os resultados em JSON neste arquivo ('-' = saída padrão)")
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(",")
+    for name in scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"cenário desconhecido: {name} (opções: {', '.join(SCENARIOS)})")
+    impair = {"loss": args.loss, "dup": args.dup, "corrupt": args.corrupt, "delay": args.delay_ms / 1000,
+              "jitter": args.jitter_ms / 1000, "seed": args.seed}
+
+    out = sys.stdout
+    workdir = tempfile.mkdtemp(prefix="bench_load_")
+    cwd = os.getcwd()
+    os.chdir(workdir)  #o receptor grava recv_<arquivo> no diretorio atual
+    report = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+              "platform": platform.platform(), "wire": args.wire, "mtu": args.mtu, "workers": args.workers, "impair": impair, "results": {}}
+    try:
+        #os nos imprimem cada mensagem; so o resumo interessa aqui
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for name in scenarios:
+                if name == "talk":
+                    results = run_talk(args)
+                elif name == "talk_lossy":
+                    results = run_talk(args, impair)
+                elif name == "file":
+                    results = run_file(args, [int(size) for size in args.sizes.split(",")])
+                elif name == "file_lossy":
+                    results = run_file(args, [args.lossy_size], impair)
+                else:
+                    results = run_heartbeat(args)
+                report["results"][name] = results
+                for result in results:
+                    print(summary(name, result), file=out if args.json != "-" else sys.stderr, flush=True)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+    if args.json == "-":
+        json.dump(report, out, indent=2)
+        out.write("\n")
+    elif args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
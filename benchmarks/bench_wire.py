@@ -0,0 +1,55 @@
+# Compara o formato texto (base64) com o binario para CHUNKs:
+# bytes na rede por MB de arquivo e tempo de CPU por MB (codificar + decodificar).
+#
+# Uso: python benchmarks/bench_wire.py [--mb 16] [--chunk 1024]
+import argparse
+import base64
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import wire
+
+
+def text_roundtrip(chunks):
+    wire_bytes = 0
+    for seq, chunk in enumerate(chunks, 1):
+        base64_data = base64.b64encode(chunk).decode('utf-8')
+        packet = f"CHUNK msg1 {seq} {base64_data}".encode('utf-8')
+        wire_bytes += len(packet)
+        parts = packet.decode('utf-8').strip().split(" ", 3)
+        base64.b64decode(parts[3].encode('utf-8'))
+    return wire_bytes
+
+
+def binary_roundtrip(chunks):
+    wire_bytes = 0
+    for seq, chunk in enumerate(chunks, 1):
+        packet = wire.encode(wire.TYPE_CHUNK, 1, seq, chunk)
+        wire_bytes += len(packet)
+        wire.decode(packet)
+    return wire_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do formato de CHUNK")
+    parser.add_argument("--mb", type=int, default=16, help="Tamanho do arquivo simulado em MB")
+    parser.add_argument("--chunk", type=int, default=1024, help="Bytes de arquivo por CHUNK")
+    args = parser.parse_args()
+
+    data = os.urandom(args.mb * 1024 * 1024)
+    chunks = [data[i:i + args.chunk] for i in range(0, len(data), args.chunk)]
+
+    print(f"{'formato':<8} {'bytes/MB':>12} {'overhead':>9} {'CPU ms/MB':>10}")
+    for name, roundtrip in (("text", text_roundtrip), ("binary", binary_roundtrip)):
+        start = time.process_time()
+        wire_bytes = roundtrip(chunks)
+        cpu = time.process_time() - start
+        per_mb = wire_bytes / args.mb
+        overhead = wire_bytes / len(data) - 1
+        print(f"{name:<8} {per_mb:>12.0f} {overhead:>8.1%} {cpu * 1000 / args.mb:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+# Conferencia de compatibilidade com o no antigo (wire=0) em loopback: um UdpNode atual no
+# processo e o udp_node.py da versao de referencia num subprocesso, comandado pelo console dele.
+#   talk      - TALK nos dois sentidos
+#   sendfile  - arquivo do no atual para o antigo e do antigo para o atual
+# O no antigo so confirma CHUNK a CHUNK (ACK msgN-seqK), responde ao END com "ACK msgN" e
+# recusa CHUNK fora de ordem; o atual tem que terminar sem desistir e sem reenvios de sobra.
+#
+# Uso: git worktree add /tmp/legacy <commit de referencia>
+#      python benchmarks/check_legacy.py --legacy-dir /tmp/legacy [--size 64]
+import argparse
+import contextlib
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from udp_node import UdpNode
+from device_info import DeviceInfo
+from bench_load import LOCALHOST, wait_for
+
+def free_port():
+    with contextlib.closing(socket.socket(socket.AF_INET, socket.SOCK_DGRAM)) as s:
+        s.bind((LOCALHOST, 0))
+        return s.getsockname()[1]
+
+
+class LegacyNode:
+    # o no antigo num subprocesso: comandos pelo stdin, saida guardada para conferir depois
+    def __init__(self, legacy_dir, workdir):
+        self.port = free_port()
+        #HEARTBEAT para a propria porta: so quem recebe unicast dele e o no atual
+        command = [sys.executable, "-u", os.path.join(os.path.abspath(legacy_dir), "udp_node.py"), "--name", "L",
+                   "--listen-port", str(self.port), "--dest-ip", LOCALHOST, "--dest-port", str(self.port)]
+        self.process = subprocess.Popen(command, cwd=workdir, text=True,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.output = []
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            self.output.append(line)
+
+    def command(self, line):
+        self.process.stdin.write(line + "\n")
+        self.process.stdin.flush()
+
+    def saw(self, text):
+        return any(text in line for line in self.output)
+
+    def stop(self):
+        self.process.kill()
+        self.process.wait()
+
+
+def check(out, name, ok, detail=""):
+    print(f"{name:<22} {'ok' if ok else 'FALHOU'} {detail}".rstrip(), file=out, flush=True)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compatibilidade com o nó antigo em loopback")
+    parser.add_argument("--legacy-dir", required=True, help="Checkout da versão de referência (udp_node.py antigo)")
+    parser.add_argument("--size", type=int, default=64, help="Tamanho do arquivo em KB")
+    parser.add_argument("--wire", choices=["binary", "text"], default="binary", help="--wire do nó atual")
+    parser.add_argument("--timeout", type=float, default=30, help="Tempo máximo por conferência em segundos")
+    args = parser.parse_args()
+
+    out = sys.stdout
+    workdir = tempfile.mkdtemp(prefix="check_legacy_")
+    cwd = os.getcwd()
+    os.chdir(workdir)  #os dois nos gravam recv_<arquivo> aqui
+    legacy = LegacyNode(args.legacy_dir, workdir)
+    results = []
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            node = UdpNode("A", 0, LOCALHOST, 0, wire_format=args.wire, max_transfers=1)
+            node.start_services(LOCALHOST, 0, heartbeat=False)
+            node.active_devices["L"] = DeviceInfo("L", LOCALHOST, legacy.port, 0)
+            time.sleep(0.5)  #o no antigo precisa estar escutando
+            node.send_heartbeat(LOCALHOST, legacy.port)  #o antigo so conhece quem manda HEARTBEAT
+
+            done = threading.Event()
+            outcome = []
+            node.send_talk("L", "ola do atual", on_done=lambda ok: (outcome.append(ok), done.set()))
+            done.wait(args.timeout)
+            results.append(check(out, "talk atual->antigo", outcome == [True]))
+            legacy.command("talk A ola do antigo")
+            deadline = time.monotonic() + args.timeout
+            while not legacy.saw("[ACK recebido]") and time.monotonic() < deadline:
+                time.sleep(0.01)
+            results.append(check(out, "talk antigo->atual", legacy.saw("[ACK recebido]")))
+
+            for direction, path in (("atual->antigo", "para_antigo.bin"), ("antigo->atual", "para_atual.bin")):
+                data = os.urandom(args.size * 1024)
+                with open(path, "wb") as f:
+                    f.write(data)
+                start = time.perf_counter()
+                if direction == "atual->antigo":
+                    sent = node.send_file("L", path)
+                else:
+                    legacy.command(f"sendfile A {path}")
+                    sent = True
+                received = sent and wait_for(f"recv_{path}", args.timeout)
+                wall = time.perf_counter() - start
+                if received:
+                    time.sleep(0.2)  #o antigo grava direto em recv_<arquivo>: espera terminar
+                    with open(f"recv_{path}", "rb") as f:
+                        received = f.read() == data
+                results.append(check(out, f"sendfile {direction}", received, f"{wall:.2f}s"))
+
+            time.sleep(4)  #passa do timeout de reenvio do antigo (3 s): ACK faltando vira [RETX]
+            problems = [line.strip() for line in legacy.output if "[ERRO]" in line or "[RETX]" in line]
+            results.append(check(out, "sem reenvio no antigo", not problems, "; ".join(problems[:3])))
+            results.append(check(out, "sem desistencia no atual", node.metrics.counters["transfers"].get("falha", 0) == 0))
+    finally:
+        legacy.stop()
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == '__main__':
+    main()
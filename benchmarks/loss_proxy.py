@@ -0,0 +1,111 @@
+# Proxy UDP local que fica entre dois nos e estraga o trafego: descarta, duplica,
+# corrompe e atrasa datagramas (atraso com jitter tambem reordena).
+#
+# O no A fala com a porta port_a do proxy como se fosse B, e B ve o proxy na porta
+# port_b como se fosse A; cada lado responde para o endereco de onde recebeu, entao
+# basta cadastrar o outro no com a porta do proxy:
+#
+#   proxy = LossProxy(("127.0.0.1", porta_a), ("127.0.0.1", porta_b), loss=0.02)
+#   proxy.start()
+#   a.active_devices["B"] = DeviceInfo("B", "127.0.0.1", proxy.port_a, wire.WIRE_VERSION)
+#   b.active_devices["A"] = DeviceInfo("A", "127.0.0.1", proxy.port_b, wire.WIRE_VERSION)
+#
+# corrupt so estraga datagramas com checksum proprio: frames binarios (crc no cabecalho) e
+# CHUNK texto com crc=. ACK/SACK/END e o resto do texto nao tem checksum no protocolo (na rede
+# o checksum do UDP descarta o datagrama); corrompidos eles ainda seriam aceitos e um SACK com
+# cum_seq ou m= errado confirmaria CHUNKs que nao chegaram.
+import heapq
+import itertools
+import random
+import socket
+import threading
+import time
+import wire
+
+
+def checksummed(data):
+    return wire.is_binary(data) or (data.startswith(b"CHUNK ") and b" crc=" in data)
+
+
+class LossProxy:
+    def __init__(self, a_addr, b_addr, loss=0.0, dup=0.0, delay=0.0, jitter=0.0, seed=None, corrupt=0.0):
+        # loss/dup/corrupt: probabilidades por datagrama; delay/jitter em segundos (atraso = delay + uniforme(0, jitter))
+        self.loss = loss
+        self.dup = dup
+        self.corrupt = corrupt  #troca um bit aleatorio dos datagramas com checksum (checksummed)
+        self.delay = delay
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.sock_a = self._bind()  #lado que A enxerga
+        self.sock_b = self._bind()  #lado que B enxerga
+        self.port_a = self.sock_a.getsockname()[1]
+        self.port_b = self.sock_b.getsockname()[1]
+        self.routes = {self.sock_a: (self.sock_b, b_addr), self.sock_b: (self.sock_a, a_addr)}
+        self.stats = {"forwarded": 0, "dropped": 0, "duplicated": 0, "corrupted": 0}
+        self.queue = []  #heap (quando entregar, contador, socket, dados, destino)
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.running = False
+
+    @staticmethod
+    def _bind():
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        sock.settimeout(0.2)  #para o pump perceber o stop()
+        return sock
+
+    def start(self):
+        self.running = True
+        for sock in self.routes:
+            threading.Thread(target=self._pump, args=(sock,), daemon=True).start()
+        threading.Thread(target=self._deliver, daemon=True).start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+
+    def _pump(self, sock):
+        out_sock, dest = self.routes[sock]
+        while self.running:
+            try:
+                data = sock.recv(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            if self.random.random() < self.loss:
+                self.stats["dropped"] += 1
+                continue
+            if checksummed(data) and self.random.random() < self.corrupt:
+                self.stats["corrupted"] += 1
+                data = bytearray(data)
+                data[self.random.randrange(len(data))] ^= 1 << self.random.randrange(8)
+                data = bytes(data)
+            copies = 1
+            if self.random.random() < self.dup:
+                self.stats["duplicated"] += 1
+                copies = 2
+            for _ in range(copies):
+                self.stats["forwarded"] += 1
+                wait = self.delay + self.random.uniform(0, self.jitter)
+                if wait <= 0:
+                    out_sock.sendto(data, dest)
+                    continue
+                with self.cond:
+                    heapq.heappush(self.queue, (time.monotonic() + wait, next(self.counter), out_sock, data, dest))
+                    self.cond.notify()
+
+    def _deliver(self):
+        while True:
+            with self.cond:
+                while self.running and (not self.queue or self.queue[0][0] > time.monotonic()):
+                    self.cond.wait(self.queue[0][0] - time.monotonic() if self.queue else None)
+                if not self.running:
+                    return
+                _, _, out_sock, data, dest = heapq.heappop(self.queue)
+            try:
+                out_sock.sendto(data, dest)
+            except OSError:
+                pass
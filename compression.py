@@ -0,0 +1,82 @@
+import lzma
+import os
+import zlib
+
+# Compressao por CHUNK: cada CHUNK e comprimido sozinho, entao reenvio e chegada fora de
+# ordem continuam funcionando. Quem comprime anuncia comp=<codec> no FILE e marca os CHUNKs
+# comprimidos com wire.FLAG_COMPRESSED (so no formato binario); um CHUNK que nao diminui vai cru.
+
+DEFAULT_LEVELS = {"zlib": 1, "lzma": 1}  #zlib 6 comprime quase igual com metade da vazao (benchmarks/bench_compression.py)
+SAMPLE_CHUNKS = 4  #CHUNKs amostrados do arquivo para decidir se vale comprimir
+MIN_SAVING = 0.1  #amostra precisa encolher pelo menos 10%, senao o envio vai sem compressao
+
+_LZMA_DICT = 1 << 16  #o dicionario so precisa cobrir um CHUNK; o padrao (8 MB) pesa para o receptor
+
+
+def _lzma_filters(level=None):
+    lzma2 = {"id": lzma.FILTER_LZMA2, "dict_size": _LZMA_DICT}  #dict_size vale mesmo com preset
+    if level is not None:
+        lzma2["preset"] = level
+    return [lzma2]
+
+
+def _zlib_compress(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)  #deflate cru: o crc do cabecalho binario ja confere
+    return compressor.compress(data) + compressor.flush()
+
+
+def _zlib_decompress(data, max_size):
+    return zlib.decompressobj(-15).decompress(data, max_size)
+
+
+def _lzma_compress(data, level):
+    return lzma.compress(data, format=lzma.FORMAT_RAW, filters=_lzma_filters(level))
+
+
+def _lzma_decompress(data, max_size):
+    return lzma.LZMADecompressor(format=lzma.FORMAT_RAW, filters=_lzma_filters()).decompress(data, max_size)
+
+
+CODECS = {"zlib": (_zlib_compress, _zlib_decompress), "lzma": (_lzma_compress, _lzma_decompress)}
+SUPPORTED = tuple(CODECS)  #anunciado no HEARTBEAT (comp=zlib,lzma)
+
+
+class CompressionError(ValueError):
+    pass
+
+
+class Compressor:
+    def __init__(self, codec, level=None):
+        if codec not in CODECS:
+            raise CompressionError(f"codec desconhecido: {codec}")
+        self.codec = codec
+        self.level = DEFAULT_LEVELS[codec] if level is None else level
+        self._compress = CODECS[codec][0]
+
+    def compress(self, chunk):
+        # retorna o CHUNK comprimido, ou None se nao ficou menor (vai cru)
+        packed = self._compress(chunk, self.level)
+        return packed if len(packed) < len(chunk) else None
+
+    def worth_it(self, file_path, chunk_size):
+        # comprime alguns CHUNKs espalhados pelo arquivo; arquivos ja comprimidos (zip, jpg, ...) ficam de fora
+        size = os.path.getsize(file_path)
+        original = packed = 0
+        with open(file_path, 'rb') as f:
+            for i in range(SAMPLE_CHUNKS):
+                f.seek(size * i // SAMPLE_CHUNKS // chunk_size * chunk_size)
+                chunk = f.read(chunk_size)
+                original += len(chunk)
+                packed += len(self._compress(chunk, self.level))
+        return original > 0 and packed <= original * (1 - MIN_SAVING)
+
+
+def decompress(codec, data, max_size):
+    # max_size = tamanho do CHUNK negociado: um CHUNK nunca descomprime para mais que isso
+    if codec not in CODECS:
+        raise CompressionError(f"codec desconhecido: {codec}")
+    try:
+        chunk = CODECS[codec][1](data, max_size)
+    except (zlib.error, lzma.LZMAError) as e:
+        raise CompressionError(str(e)) from e
+    return chunk
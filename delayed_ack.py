@@ -0,0 +1,56 @@
+import heapq
+import threading
+import time
+
+# SACKs adiados do receptor (ACK atrasado, como no TCP): um CHUNK em ordem nao e confirmado
+# na hora; o SACK sai depois de ACK_EVERY CHUNKs ou ACK_DELAY segundos, o que vier primeiro,
+# e confirma todos de uma vez. Fora de ordem, duplicado ou ultimo CHUNK confirmam na hora.
+# Aqui so ficam os prazos; quem monta e manda o SACK e o MessageHandler (flush_acks do no).
+
+ACK_EVERY = 8  #CHUNKs por SACK; bem abaixo da janela do emissor (64) para ela nao esvaziar
+ACK_DELAY = 0.005  #prazo maximo do SACK adiado; bem abaixo do MIN_RTO (50 ms) para nao causar reenvio
+
+
+class DelayedAcks:
+    def __init__(self, delay=ACK_DELAY, on_earlier_deadline=None):
+        self.delay = delay
+        self.heap = []  #(prazo, chave do recebimento)
+        self.scheduled = set()  #chaves com prazo no heap
+        self.cond = threading.Condition()
+        self.on_earlier_deadline = on_earlier_deadline #avisa quem espera fora do Condition (ex.: asyncio)
+
+    def defer(self, key):
+        # agenda o SACK de `key` (ip, porta, msg) se ainda nao ha um agendado
+        with self.cond:
+            if key in self.scheduled:
+                return
+            self.scheduled.add(key)
+            deadline = time.monotonic() + self.delay
+            wakeup = not self.heap or deadline < self.heap[0][0]
+            heapq.heappush(self.heap, (deadline, key))
+            if wakeup:
+                self.cond.notify_all()
+                if self.on_earlier_deadline:
+                    self.on_earlier_deadline()
+
+    def pop_due(self, now):
+        due = []
+        with self.cond:
+            while self.heap and self.heap[0][0] <= now:
+                _, key = heapq.heappop(self.heap)
+                self.scheduled.discard(key)
+                due.append(key)
+        return due
+
+    def next_deadline(self):
+        with self.cond:
+            return self.heap[0][0] if self.heap else None
+
+    def wait_due(self):
+        # bloqueia ate algum prazo vencer
+        with self.cond:
+            while True:
+                due = self.pop_due(time.monotonic())
+                if due:
+                    return due
+                self.cond.wait(self.heap[0][0] - time.monotonic() if self.heap else None)
@@ -1,11 +1,36 @@
 import time
 
 class DeviceInfo:
-    def __init__(self, name, ip, port):
+    __slots__ = ("name", "ip", "port", "wire_version", "codecs", "heartbeat_interval", "last_heartbeat", "version", "node_id", "direct")  #milhares de dispositivos: sem __dict__ por registro
+
+    def __init__(self, name, ip, port, wire_version=0):
         self.name = name
         self.ip = ip
-        self.port = port    
-        self.last_heartbeat = time.time()
+        self.port = port
+        self.wire_version = wire_version #0 = so entende o formato texto
+        self.codecs = () #codecs de compressao que sabe descomprimir (comp= no HEARTBEAT)
+        self.heartbeat_interval = 0 #intervalo anunciado em hb= (0 = nao anunciou)
+        self.last_heartbeat = time.monotonic()
+        self.version = 0 #v= do HEARTBEAT: cresce a cada anuncio, o gossip so aceita noticia mais nova
+        self.node_id = "" #id= do HEARTBEAT: sorteado por processo ("" = nao anunciou)
+        self.direct = True #False: so sabemos dele pelo gossip (peers=), nunca recebemos nada dele
+
+    @property
+    def key(self):
+        return (self.name, self.ip, self.port)
+
+    def label(self):
+        return f"{self.name}@{self.ip}:{self.port}"
 
     def update_heartbeat(self):
-        self.last_heartbeat = time.time()
+        self.last_heartbeat = time.monotonic()
+
+    def copy(self):
+        info = DeviceInfo(self.name, self.ip, self.port, self.wire_version)
+        info.codecs = self.codecs
+        info.heartbeat_interval = self.heartbeat_interval
+        info.last_heartbeat = self.last_heartbeat
+        info.version = self.version
+        info.node_id = self.node_id
+        info.direct = self.direct
+        return info
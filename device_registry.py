@@ -0,0 +1,182 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from device_info import DeviceInfo
+
+TIMEOUT_INTERVALS = 2  #quem anuncia hb= expira depois de 2 intervalos sem sinal (nunca antes do timeout padrao)
+GOSSIP_TIMEOUT_FACTOR = 2  #quem so conhecemos pelo gossip tem o dobro do prazo: a noticia chega com atraso
+TOMBSTONE_TTL = 60  #segundos que a versao de um dispositivo expirado e lembrada
+
+class DeviceRegistry:
+    # Dispositivos ativos, chave (nome, ip, porta): dois nos com o mesmo nome em enderecos diferentes
+    # ficam os dois (o usuario escolhe com nome@ip:porta); o mesmo endereco com outro nome substitui
+    # o registro antigo (o processo reiniciou com outro nome).
+    # Cada dispositivo tem uma entrada num heap de expiracao com o prazo calculado quando ela foi
+    # empilhada; o HEARTBEAT so atualiza last_heartbeat (nao mexe no heap) e a limpeza so olha as
+    # entradas vencidas: se o dispositivo deu sinal depois disso, a entrada volta para o heap com o prazo novo.
+    # in/len/seen/at nao pegam o lock; get e find pegam (leem by_name/devices, que o lock protege).
+    # Quem precisa de uma visao consistente usa snapshot().
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.devices = {}  #(nome, ip, porta) -> DeviceInfo
+        self.by_name = {}  #nome -> {chave: DeviceInfo}
+        self.by_addr = {}  #(ip, porta) -> DeviceInfo, para contar qualquer pacote como sinal de vida
+        self.tombstones = {}  #chave -> (versao, ate quando vale) dos expirados: gossip atrasado nao os ressuscita
+        self.expiry = []  #heap (prazo, contador, DeviceInfo)
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def touch(self, name, ip, port, wire_version=0, heartbeat_interval=0, codecs=(), version=0, node_id=""):
+        # HEARTBEAT recebido: cadastra ou renova o dispositivo; retorna True se ele e novo
+        with self.lock:
+            info = self.devices.get((name, ip, port))
+            if info is None:
+                info = DeviceInfo(name, ip, port, wire_version)
+                info.heartbeat_interval = heartbeat_interval
+                info.codecs = codecs
+                info.version = version
+                info.node_id = node_id
+                self.tombstones.pop(info.key, None)
+                self._add(info)
+                return True
+            info.update_heartbeat()
+            info.wire_version = wire_version
+            info.heartbeat_interval = heartbeat_interval
+            info.codecs = codecs
+            info.version = max(info.version, version)
+            info.node_id = node_id
+            info.direct = True
+            return False
+
+    def merge(self, name, ip, port, version, wire_version, heartbeat_interval, node_id=""):
+        # entrada de gossip (peers=): so conta se a versao for mais nova que a conhecida.
+        # Retorna True se o dispositivo e novo
+        key = (name, ip, port)
+        with self.lock:
+            info = self.devices.get(key)
+            if info is not None:
+                if version > info.version:
+                    info.version = version
+                    info.update_heartbeat()
+                    if not info.direct:  #de quem ouvimos direto o proprio HEARTBEAT vale mais
+                        info.wire_version = wire_version
+                        info.heartbeat_interval = heartbeat_interval
+                        info.node_id = node_id
+                return False
+            tombstone = self.tombstones.get(key)
+            if tombstone is not None and version <= tombstone[0]:
+                return False  #noticia velha de quem ja expirou
+            if (ip, port) in self.by_addr:
+                return False  #o endereco e de outro nome; ele expira se o gossip estiver certo
+            info = DeviceInfo(name, ip, port, wire_version)
+            info.heartbeat_interval = heartbeat_interval
+            info.version = version
+            info.node_id = node_id
+            info.direct = False
+            self.tombstones.pop(key, None)
+            self._add(info)
+            return True
+
+    def seen(self, ip, port):
+        # qualquer datagrama de um dispositivo conhecido vale como HEARTBEAT. Sem lock: no pior
+        # caso renova um registro que a limpeza acabou de remover e ele volta no proximo HEARTBEAT
+        info = self.by_addr.get((ip, port))
+        if info is not None:
+            info.last_heartbeat = time.monotonic()
+
+    def at(self, ip, port):
+        # dispositivo que usa esse endereco (ou None)
+        return self.by_addr.get((ip, port))
+
+    def find(self, target):
+        # dispositivos com esse nome, ou o de "nome@ip:porta"
+        name, at, address = target.rpartition("@")
+        with self.lock:
+            if at:
+                ip, _, port = address.rpartition(":")
+                info = self.devices.get((name, ip, int(port))) if port.isdigit() else None
+                return [info] if info else []
+            return list(self.by_name.get(target, {}).values())
+
+    def expire(self, now=None):
+        # remove e retorna os dispositivos sem sinal de vida dentro do prazo
+        now = time.monotonic() if now is None else now
+        removed = []
+        with self.lock:
+            while self.expiry and self.expiry[0][0] <= now:
+                _, _, info = heapq.heappop(self.expiry)
+                if self.devices.get(info.key) is not info:
+                    continue  #substituido ou removido depois de empilhado
+                deadline = self._deadline(info)
+                if deadline > now:
+                    heapq.heappush(self.expiry, (deadline, next(self.counter), info))
+                else:
+                    self._remove(info)
+                    self.tombstones[info.key] = (info.version, now + TOMBSTONE_TTL)
+                    removed.append(info)
+            for key in [key for key, (_, until) in self.tombstones.items() if until <= now]:
+                del self.tombstones[key]
+        return removed
+
+    def snapshot(self):
+        # copias tiradas sob o lock: nenhum HEARTBEAT muda a lista enquanto ela e exibida
+        with self.lock:
+            return [info.copy() for info in self.devices.values()]
+
+    def freshest(self, count):
+        # copias dos `count` dispositivos com sinal de vida mais recente e versao conhecida (para o gossip)
+        with self.lock:
+            infos = heapq.nlargest(count, (info for info in self.devices.values() if info.version),
+                                   key=lambda info: info.last_heartbeat)
+            return [info.copy() for info in infos]
+
+    def sample(self, count, min_wire_version=0):
+        # ate `count` dispositivos sorteados entre os que anunciam pelo menos min_wire_version
+        with self.lock:
+            candidates = [info for info in self.devices.values() if info.wire_version >= min_wire_version]
+            return [info.copy() for info in random.sample(candidates, min(count, len(candidates)))]
+
+    def _deadline(self, info):
+        timeout = max(self.timeout, TIMEOUT_INTERVALS * info.heartbeat_interval)
+        return info.last_heartbeat + (timeout if info.direct else GOSSIP_TIMEOUT_FACTOR * timeout)
+
+    def _add(self, info):
+        old = self.by_addr.get((info.ip, info.port))  #o mesmo dispositivo de novo ou outro nome no endereco
+        if old is not None:
+            self._remove(old)
+        self.devices[info.key] = info
+        self.by_name.setdefault(info.name, {})[info.key] = info
+        self.by_addr[(info.ip, info.port)] = info
+        heapq.heappush(self.expiry, (self._deadline(info), next(self.counter), info))
+
+    def _remove(self, info):
+        del self.devices[info.key]
+        same_name = self.by_name[info.name]
+        del same_name[info.key]
+        if not same_name:
+            del self.by_name[info.name]
+        if self.by_addr.get((info.ip, info.port)) is info:
+            del self.by_addr[(info.ip, info.port)]
+
+    def __setitem__(self, name, info):
+        with self.lock:
+            self._add(info)
+
+    def __getitem__(self, name):
+        info = self.get(name)
+        if info is None:
+            raise KeyError(name)
+        return info
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def __len__(self):
+        return len(self.devices)
+
+    def get(self, target, default=None):
+        # so se o nome (ou nome@ip:porta) identifica um dispositivo; com nomes repetidos use find()
+        matches = self.find(target)
+        return matches[0] if len(matches) == 1 else default
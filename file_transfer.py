@@ -0,0 +1,132 @@
+import base64
+import bisect
+import hashlib
+import os
+import threading
+import messages
+import wire
+
+CHUNK_SIZE = 1024  #tamanho fixo dos nos antigos, que nao negociam chunk= no FILE
+RESUME_MIN_SIZE = 1024 * 1024  #arquivos menores nao valem a leitura extra para calcular o fid
+# hash do arquivo inteiro (END), calculado aos poucos nas duas pontas; sem digest= no FILE e md5.
+# sha256 usa as instrucoes SHA da CPU quando existem e ai passa do md5 (benchmarks/bench_digest.py)
+DIGESTS = ("md5", "sha256", "blake2b", "sha1")
+
+_file_ids = {}  #(caminho, tamanho, mtime) -> fid, para nao reler o arquivo a cada tentativa
+_file_ids_lock = threading.Lock()
+
+
+def file_id(file_path, digest="md5"):
+    # id estavel do conteudo (o mesmo hash do END): o mesmo arquivo enviado de novo,
+    # por qualquer processo, tem o mesmo fid e o receptor pode retomar de onde parou
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, digest)
+    with _file_ids_lock:
+        if key in _file_ids:
+            return _file_ids[key]
+    hasher = hashlib.new(digest)
+    with open(file_path, 'rb') as f:
+        while block := f.read(1024 * 1024):
+            hasher.update(block)
+    with _file_ids_lock:
+        _file_ids[key] = hasher.hexdigest()
+    return _file_ids[key]
+
+
+class SeqRanges:
+    # intervalos [inicio, fim] de seqs (os que faltam, segundo o RESUME do receptor)
+    def __init__(self, ranges):
+        self.ranges = sorted(ranges)
+        self.starts = [start for start, _ in self.ranges]
+
+    def __contains__(self, seq):
+        i = bisect.bisect_right(self.starts, seq) - 1
+        return i >= 0 and seq <= self.ranges[i][1]
+
+    def __iter__(self):
+        return iter(self.ranges)
+
+class FileReader:
+    # Le o arquivo uma unica vez em CHUNKs, atualizando o hash enquanto le.
+    # Um mesmo leitor alimenta todos os destinos de um envio em fan-out.
+    def __init__(self, file_path, chunk_size, digest="md5"):
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.hasher = hashlib.new(digest)
+
+    def chunks(self, ranges=None):
+        # gera (seq, bytes do chunk); com ranges ([(inicio, fim), ...]) so le esses seqs
+        with open(self.file_path, 'rb') as f:
+            if ranges is None:
+                seq = 0
+                while chunk := f.read(self.chunk_size):
+                    seq += 1
+                    self.hasher.update(chunk)
+                    yield seq, chunk
+                return
+            next_seq = 1
+            for start, end in sorted(ranges):
+                seq = max(start, next_seq)  #intervalos sobrepostos (fan-out) sao lidos uma vez
+                f.seek((seq - 1) * self.chunk_size)
+                while seq <= end and (chunk := f.read(self.chunk_size)):
+                    yield seq, chunk
+                    seq += 1
+                next_seq = max(next_seq, seq)
+
+    def hexdigest(self):
+        # so depois de chunks() ter lido o arquivo inteiro (sem ranges)
+        return self.hasher.hexdigest()
+
+
+class FileTransfer:
+    # Mensagens de um envio de arquivo para um destino: FILE, CHUNKs e END.
+    # Nao envia nada; quem controla janela, reenvio e socket e o no (UdpNode/AsyncUdpNode).
+    def __init__(self, msg_id, file_path, binary, chunk_size=None, codec=None, fid=None, digest="md5", chunk_crc=False, fec=0):
+        self.msg_id = msg_id #numero da mensagem; no texto vai como msg_text
+        self.msg_text = f"msg{msg_id}"
+        self.file_path = file_path
+        self.binary = binary
+        self.chunk_size = chunk_size or CHUNK_SIZE
+        self.negotiate = chunk_size is not None #so anuncia opcoes para quem entende (nao legado)
+        self.codec = codec if binary else None #a marca de CHUNK comprimido so existe no formato binario
+        self.fid = fid #com fid o receptor pode responder RESUME em vez de ACK ao FILE
+        self.digest = digest
+        self.chunk_crc = chunk_crc #crc= nos CHUNKs texto e cabecalho binario versao 2 (crc cobre o seq)
+        self.frame_version = wire.FRAME_VERSION if chunk_crc else 1
+        self.fec = fec if binary else 0 #CHUNKs por PARITY (fec.py); PARITY so existe no formato binario
+        self.file_name = os.path.basename(file_path)
+        self.file_size = os.path.getsize(file_path)
+
+    def header(self):
+        header = f"FILE {self.msg_text} {self.file_name} {self.file_size}"
+        if self.negotiate:
+            header += f" chunk={self.chunk_size}"
+        if self.codec:
+            header += f" comp={self.codec}"
+        if self.fid:
+            header += f" fid={self.fid}"
+        if self.digest != "md5":
+            header += f" digest={self.digest}"
+        if self.fec:
+            header += f" fec={self.fec}"
+        return header
+
+    def encode_chunk(self, seq, chunk, packed=None):
+        # retorna (chave do pendente, mensagem); packed e o CHUNK ja comprimido (None = vai cru)
+        if self.codec and packed is not None:
+            chunk_msg = wire.encode(wire.TYPE_CHUNK, self.msg_id, seq, packed, wire.FLAG_COMPRESSED, self.frame_version)
+        elif self.binary:
+            chunk_msg = wire.encode(wire.TYPE_CHUNK, self.msg_id, seq, chunk, version=self.frame_version)
+        else:
+            base64_data = base64.b64encode(chunk).decode('utf-8')
+            chunk_msg = f"CHUNK {self.msg_text} {seq} {base64_data}"
+            if self.chunk_crc:
+                chunk_msg += f" crc={wire.text_chunk_crc(self.msg_text, seq, chunk):08x}"
+        return (self.msg_id, seq), chunk_msg
+
+    def encode_parity(self, first_seq, parity):
+        # PARITY do bloco que comeca em first_seq; nao fica pendente: se perder, vale o reenvio normal
+        return wire.encode(wire.TYPE_PARITY, self.msg_id, first_seq, parity, version=self.frame_version)
+
+    def end_message(self, file_hash):
+        return (self.msg_id, messages.END), f"END {self.msg_text} {file_hash}"
@@ -0,0 +1,22 @@
+# Verbosidade das mensagens do no (--verbosity). Erros sempre aparecem.
+#   0 = so erros, 1 = eventos (arquivo recebido, dispositivo removido, ...), 2 = cada pacote
+# As mensagens por pacote ficam atras de `if log.level >= log.DEBUG`, para nem montar a
+# string no caminho quente; o que elas contavam esta nas metricas (comando stats).
+
+ERROR, INFO, DEBUG = 0, 1, 2
+level = INFO
+
+
+def set_level(new_level):
+    global level
+    level = new_level
+
+
+def info(message):
+    if level >= INFO:
+        print(message)
+
+
+def debug(message):
+    if level >= DEBUG:
+        print(message)
@@ -0,0 +1,72 @@
+import random
+import socket
+import threading
+import time
+import log
+import messages
+
+# Descoberta alem do broadcast: nos em outras sub-redes ou portas se acham por sementes
+# (--seed ip:porta) e por gossip. A cada rodada o no manda, por unicast, um HEARTBEAT com
+# peers= (os dispositivos com noticia mais recente) para GOSSIP_FANOUT dispositivos sorteados
+# e para as sementes que ainda nao responderam. Quem recebe cadastra os que nao conhecia e
+# renova os que vem com versao (v=) maior; quem aparece pela primeira vez com peers= recebe
+# a lista na hora, entao um no novo conhece a rede depois de uma ida e volta com a semente.
+# Nos antigos tratam esse HEARTBEAT como um qualquer (ignoram as opcoes que nao conhecem).
+
+GOSSIP_INTERVAL = 1.0  #segundos entre rodadas (sorteado em +-20%)
+GOSSIP_FANOUT = 3  #destinos por rodada
+MAX_GOSSIP_PEERS = 20  #entradas por HEARTBEAT de gossip (~60 bytes cada, cabe num datagrama de 1500)
+GOSSIP_WIRE_VERSION = 5  #quem entende peers= e repassa
+
+
+def parse_address(text):
+    # "ip:porta" (ou "host:porta") de --seed
+    host, _, port = text.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"endereço inválido: {text} (use ip:porta)")
+    return socket.gethostbyname(host), int(port)
+
+
+class Membership:
+    def __init__(self, node, seeds=()):
+        self.node = node
+        self.seeds = list(seeds)  #[(ip, porta)]
+        #a versao parte do relogio: um no reiniciado continua acima do que a rede lembra dele
+        self.version = int(time.time() * 1000)
+        #sorteado a cada processo: e como nos reconhecemos nas listas dos outros, que nos veem
+        #com o ip deles para nos (outro no com o mesmo nome e porta em outra maquina nao e a gente)
+        self.node_id = f"{random.getrandbits(32):08x}"
+        self.lock = threading.Lock()
+
+    def next_version(self):
+        # versao do proximo anuncio (v= de cada HEARTBEAT que mandamos)
+        with self.lock:
+            self.version = max(self.version + 1, int(time.time() * 1000))
+            return self.version
+
+    def gossip_message(self):
+        peers = ",".join(messages.format_peer(info) for info in self.node.active_devices.freshest(MAX_GOSSIP_PEERS)
+                         if "," not in info.name)
+        return f"{self.node.heartbeat_message()} peers={peers}"
+
+    def tick(self):
+        # uma rodada de gossip; retorna quanto esperar ate a proxima
+        targets = [(info.ip, info.port) for info in self.node.active_devices.sample(GOSSIP_FANOUT, GOSSIP_WIRE_VERSION)]
+        targets += [seed for seed in self.seeds if self.node.active_devices.at(*seed) is None]
+        if targets:
+            message = self.gossip_message()
+            for ip, port in targets:
+                self.node.send_udp(message, ip, port)
+        return GOSSIP_INTERVAL * random.uniform(0.8, 1.2)
+
+    def receive(self, peers, sender_new, sender_ip, sender_port):
+        # peers= de um HEARTBEAT de gossip
+        for peer in peers:
+            if peer.node_id == self.node_id:
+                continue  #nos mesmos, visto por outro no
+            if self.node.active_devices.merge(peer.name, peer.ip, peer.port, peer.version, peer.wire_version, peer.interval,
+                                              peer.node_id):
+                log.info(f">>> [INFO] Dispositivo conhecido via gossip: {peer.name}@{peer.ip}:{peer.port}")
+        if sender_new:
+            #no que acabou de entrar (ou semente que respondeu): manda o que sabemos sem esperar a rodada
+            self.node.send_udp(self.gossip_message(), sender_ip, sender_port)
@@ -1,81 +1,457 @@
-from device_info import DeviceInfo
 import hashlib
-import base64
 import os
+import tempfile
+import threading
+import time
+import wire
+import compression
+import fec
+import log
+import messages
+import metrics
+import resume_manifest
+from file_transfer import CHUNK_SIZE, DIGESTS
+from delayed_ack import ACK_EVERY
+
+received_chunks = {}  #dict para armazenar a parte recebida do arquivo, chave (ip, porta, numero da mensagem) do emissor
+RECV_WINDOW_BYTES = 4 * 1024 * 1024  #maximo de bytes fora de ordem guardados a frente do ultimo seq contiguo
+MAX_SACK_BLOCKS = 4  #quantos intervalos fora de ordem vao em cada SACK
+MAX_SACK_BITS = 1024  #alcance do mapa de bits do SACK (wire=3) a partir do ACK cumulativo
+finished_transfers = {}  #(ip, porta, msg_id) -> resposta dada ao END, para responder END reenviado
+MAX_FINISHED_TRANSFERS = 256
+MANIFEST_INTERVAL = 1.0  #segundos entre gravacoes do manifesto de um recebimento retomavel
+RECV_IDLE_TIMEOUT = 60  #segundos sem CHUNK ate largar um recebimento (o emissor desiste bem antes)
+
+
+def sack_blocks(out_of_order, seq):
+    # intervalos [inicio-fim] de seqs recebidos acima do ACK cumulativo;
+    # como no TCP (RFC 2018), o bloco do seq que acabou de chegar vai primeiro e depois os mais recentes
+    blocks = []
+    for s in sorted(out_of_order):
+        if blocks and blocks[-1][1] == s - 1:
+            blocks[-1][1] = s
+        else:
+            blocks.append([s, s])
+    blocks.sort(key=lambda b: (not b[0] <= seq <= b[1], -b[0]))
+    return blocks[:MAX_SACK_BLOCKS]
+
+
+def sack_bitmap(out_of_order, last_seq):
+    # seqs recebidos acima do ACK cumulativo como mapa de bits: bit i = seq last_seq + 1 + i.
+    # Diferente dos blocos, nao perde nada com muitos buracos (ate MAX_SACK_BITS)
+    bitmap = 0
+    for s in out_of_order:
+        offset = s - last_seq - 1
+        if offset < MAX_SACK_BITS:
+            bitmap |= 1 << offset
+    return bitmap
 
-received_chunks = {}  #dict para armazenar a parte recebida do arquivo
 
 class MessageHandler:
+    # Despacho por tabela: tipo -> (parser, handler). O tipo e o comando das mensagens texto
+    # ("TALK", ...) ou o wire.TYPE_* das binarias. O parser monta o registro (messages.py) uma
+    # vez e o handler recebe (registro, ip, porta, no). Extensoes registram tipos novos com register()
+    handlers = {}
+
+    @classmethod
+    def register(cls, code, parse, handle):
+        # parse(resto da mensagem depois do tipo) para texto, parse(flags, msg_id, seq, payload) para binario
+        cls.handlers[code] = (parse, handle)
+
+    @staticmethod
+    def handle_datagram(data, sender_ip, sender_port, udp_node):
+        # data pode ser bytes ou memoryview (buffer reaproveitado pelo BatchReceiver): o payload
+        # binario e repassado como fatia, sem copia, e so e copiado se ficar guardado
+        udp_node.active_devices.seen(sender_ip, sender_port)  #qualquer pacote conta como sinal de vida
+        udp_node.metrics.count_packet("in", data)
+        if not wire.is_binary(data):
+            try:
+                MessageHandler.handle_message(str(data, 'utf-8'), sender_ip, sender_port, udp_node)
+            except ValueError as e:  #inclui UnicodeDecodeError: mensagem texto truncada ou corrompida
+                log.debug(f"[DESCARTADO] Mensagem de {sender_ip} mal formada: {e}")
+            return
+        try:
+            msg_type, flags, msg_id, seq, payload = wire.decode(data)
+        except wire.ChecksumError as e:
+            if e.msg_type == wire.TYPE_CHUNK:
+                MessageHandler.reject_chunk(e.msg_id, e.seq, sender_ip, sender_port, udp_node)
+            return
+        except wire.WireError as e:
+            log.debug(f"[DESCARTADO] Mensagem binária de {sender_ip}: {e}")
+            return  #sem ACK: o emissor reenvia
+        entry = MessageHandler.handlers.get(msg_type)
+        if entry:
+            parse, handle = entry
+            handle(parse(flags, msg_id, seq, payload), sender_ip, sender_port, udp_node)
+
     @staticmethod
     def handle_message(message, sender_ip, sender_port, udp_node):
-        parts = message.strip().split(" ", 3)
-        if not parts:
+        cmd, _, rest = message.strip().partition(" ")
+        entry = MessageHandler.handlers.get(cmd)
+        if entry is None:
             return
+        parse, handle = entry
+        record = parse(rest)
+        if record is not None:
+            handle(record, sender_ip, sender_port, udp_node)
+
+    @staticmethod
+    def handle_heartbeat(heartbeat, sender_ip, sender_port, udp_node):
+        new = udp_node.active_devices.touch(heartbeat.name, sender_ip, sender_port, heartbeat.wire_version,
+                                            heartbeat.interval, heartbeat.codecs, heartbeat.version, heartbeat.node_id)
+        if heartbeat.peers is not None:  #HEARTBEAT de gossip (membership.py)
+            udp_node.membership.receive(heartbeat.peers, new, sender_ip, sender_port)
+
+    @staticmethod
+    def handle_talk(talk, sender_ip, sender_port, udp_node):
+        print(f"[TALK recebido de {sender_ip}] {talk.text}")
+        udp_node.send_udp(f"ACK {talk.msg_id}", sender_ip, sender_port)
 
-        cmd = parts[0]
+    @staticmethod
+    def handle_ack(ack, sender_ip, sender_port, udp_node):
+        msg_id, seq = ack.key
+        pm = udp_node.pending_messages.pop(ack.key, None)
+        if seq > 0:
+            #receptor antigo confirma CHUNK a CHUNK com ACK msgN-seqK em vez de SACK: libera a janela tambem
+            window = udp_node.send_windows.get(msg_id)
+            if window:
+                window.ack(0, [(seq, seq)])
+        elif pm is None and seq == messages.MESSAGE:
+            #receptor antigo responde ao END com "ACK msgN" (o FILE ja foi confirmado); de um novo
+            #seria so a resposta repetida a um FILE reenviado
+            info = udp_node.active_devices.at(sender_ip, sender_port)
+            if info and info.wire_version == 0:
+                pm = udp_node.pending_messages.pop((msg_id, messages.END), None)
+        if pm:
+            MessageHandler.acknowledge(pm, udp_node)
+            if log.level >= log.DEBUG:
+                print(f"[ACK recebido] {messages.format_key(ack.key)}")
+
+    @staticmethod
+    def handle_sack(sack, sender_ip, sender_port, udp_node):
+        window = udp_node.send_windows.get(sack.msg_id)
+        if window:
+            acked = window.ack(sack.cum_seq, sack.blocks, sack.bitmap)
+            if acked:
+                #com ACK atrasado um SACK confirma varios CHUNKs: o RTT so e amostrado no mais novo,
+                #os outros ficaram esperando o SACK e inflariam a estimativa
+                newest = max(acked)
+                for pm in udp_node.pending_messages.pop_many([(sack.msg_id, seq) for seq in acked]):
+                    MessageHandler.acknowledge(pm, udp_node, pm.id[1] == newest)
+
+    @staticmethod
+    def handle_file(header, sender_ip, sender_port, udp_node):
+        msg_id, filename, filesize = header.msg_id, header.filename, header.filesize
+        chunk_size = header.chunk_size or CHUNK_SIZE
+        if header.digest not in DIGESTS:
+            udp_node.metrics.inc("nacks_out", "digest_desconhecido")
+            udp_node.send_udp(f"NACK msg{msg_id} digest_desconhecido", sender_ip, sender_port)
+            return
+        key = (sender_ip, sender_port, msg_id)
+        if key in received_chunks:  #FILE retransmitido (resposta perdida): responde de novo
+            udp_node.send_udp(received_chunks[key]["file_reply"], sender_ip, sender_port)
+            return
+        if key in finished_transfers:  #FILE reenviado que chegou depois do END: so confirma
+            udp_node.send_udp(f"ACK msg{msg_id}", sender_ip, sender_port)
+            return
+        file_entry = MessageHandler.resume_entry(filename, filesize, chunk_size, header.fid, header.digest) if header.fid else None
+        if file_entry is None:
+            log.info(f"[FILE recebido] {filename} ({filesize} bytes)")
+            file_entry = MessageHandler.new_entry(filename, filesize, chunk_size, header.fid, header.digest)
+            file_entry["file_reply"] = f"ACK msg{msg_id}"
+            file_entry["fec"] = fec.ParityDecoder(header.fec, chunk_size, filesize) if header.fec else None
+        else:
+            #RESUME: o emissor so manda os intervalos que faltam
+            total_chunks = -(-filesize // chunk_size)
+            missing = resume_manifest.missing_ranges(file_entry["last_seq"], file_entry["out_of_order"], total_chunks)
+            file_entry["file_reply"] = f"RESUME msg{msg_id} " + ",".join(f"{start}-{end}" for start, end in missing)
+            log.info(f"[FILE retomado] {filename}: {file_entry['last_seq']}/{total_chunks} CHUNKs contíguos já recebidos")
+            file_entry["fec"] = None  #os CHUNKs de antes nao estao no XOR dos blocos
+        file_entry["codec"] = header.codec
+        file_entry["last_activity"] = time.monotonic()  #a entrada retomada da memoria pode estar parada ha tempo
+        info = udp_node.active_devices.at(sender_ip, sender_port)
+        file_entry["sack_bitmap"] = bool(info and info.wire_version >= 3)  #os antigos so entendem blocos
+        #emissor antigo (nunca manda chunk=) nao entende SACK: ACK por CHUNK. Nao depende do cadastro:
+        #um emissor novo que ainda nao conhecemos (ou que expirou) continua so com SACK
+        file_entry["chunk_acks"] = header.chunk_size is None
+        received_chunks[key] = file_entry
+        udp_node.send_udp(file_entry["file_reply"], sender_ip, sender_port)
 
-        if cmd == "HEARTBEAT" and len(parts) > 1:
-            name = parts[1]
-            if name not in udp_node.active_devices:
-                udp_node.active_devices[name] = DeviceInfo(name, sender_ip, sender_port)
+    @staticmethod
+    def handle_end(end, sender_ip, sender_port, udp_node):
+        msg_id = end.msg_id
+        key = (sender_ip, sender_port, msg_id)
+        if key in finished_transfers:  #END reenviado (nossa resposta se perdeu)
+            udp_node.send_udp(finished_transfers[key], sender_ip, sender_port)
+        elif key in received_chunks:
+            file_entry = received_chunks[key]
+            file_entry["file"].close()
+            filename = file_entry["filename"]
+            if file_entry["fid"]:
+                resume_manifest.remove(filename, file_entry["fid"])
+            if file_entry["hasher"].hexdigest() == end.file_hash:
+                os.replace(file_entry["part_path"], f"recv_{filename}")
+                reply = f"ACK msg{msg_id}-end"
+                udp_node.metrics.inc("files_received", "ok")
+                log.info(f"[Arquivo salvo como recv_{filename}]")
             else:
-                udp_node.active_devices[name].update_heartbeat()
-            #print(f"[INFO] HEARTBEAT de {name}")
-
-        elif cmd == "TALK" and len(parts) >= 3:
-            msg_id = parts[1]
-            data = " ".join(parts[2:]) # Mensagem pode conter espaços / multiplas palavras
-            print(f"[TALK recebido de {sender_ip}] {data}")
-            udp_node.send_udp(f"ACK {msg_id}", sender_ip, sender_port)
-
-        elif cmd == "ACK" and len(parts) >= 2:
-            ack_id = parts[1]
-            if ack_id in udp_node.pending_messages:
-                udp_node.pending_messages[ack_id].acknowledged = True
-                del udp_node.pending_messages[ack_id]
-                print(f"[ACK recebido] {ack_id}")
-
-        elif cmd == "FILE" and len(parts) >= 4:
-            msg_id, filename, filesize = parts[1], parts[2], int(parts[3])
-            print(f"[FILE recebido] {filename} ({filesize} bytes)")
-            received_chunks[msg_id] = {"chunks": {}, "filename": filename, "filesize": filesize, "last_seq": 0}
-            udp_node.send_udp(f"ACK {msg_id}", sender_ip, sender_port)
-
-        elif cmd == "CHUNK" and len(parts) >= 4:
-            msg_id, seq, b64data = parts[1], int(parts[2]), parts[3]
-            chunk_data = base64.b64decode(b64data.encode('utf-8'))
-            if msg_id in received_chunks:
-                file_entry = received_chunks[msg_id]
-                if seq in file_entry["chunks"]:
+                os.remove(file_entry["part_path"])
+                reply = f"NACK msg{msg_id} hash_invalido"
+                udp_node.metrics.inc("files_received", "hash_invalido")
+                udp_node.metrics.inc("nacks_out", "hash_invalido")
+                log.info("[NACK enviado] Hash inválido no arquivo recebido")
+            udp_node.send_udp(reply, sender_ip, sender_port)
+            del received_chunks[key]
+            finished_transfers[key] = reply
+            if len(finished_transfers) > MAX_FINISHED_TRANSFERS:
+                finished_transfers.pop(next(iter(finished_transfers)), None)  #com --workers outro worker pode ter removido antes
+
+    @staticmethod
+    def handle_nack(nack, sender_ip, sender_port, udp_node):
+        udp_node.metrics.inc("nacks_in", nack.reason if nack.reason in metrics.NACK_REASONS else "outro")
+        msg_id, seq = nack.key
+        if seq > 0:
+            #CHUNK chegou corrompido: reenvia ja, sem esperar o timeout
+            pm = udp_node.pending_messages.get(nack.key)
+            if pm:
+                udp_node.resend_now(pm)
+            return
+        if nack.reason.startswith("fora_de_ordem"):
+            #receptor antigo descarta CHUNK fora de ordem; o reenvio por timeout resolve
+            log.debug(f"[NACK recebido] ID={messages.format_key(nack.key)} Motivo={nack.reason}")
+            return
+        #resposta definitiva ao FILE (digest_desconhecido) ou ao END (hash_invalido): nao reenvia, e
+        #um FILE recusado aborta a transferencia na hora (o receptor nao tem onde guardar os CHUNKs)
+        for pm in udp_node.pending_messages.pop_many([(msg_id, messages.MESSAGE), (msg_id, messages.END)]):
+            pm.give_up()
+        window = udp_node.send_windows.get(msg_id)
+        if window:
+            window.fail()
+        log.info(f"[NACK recebido] ID={messages.format_key(nack.key)} Motivo={nack.reason}")
+
+    @staticmethod
+    def handle_resume(resume, sender_ip, sender_port, udp_node):
+        #resposta ao FILE de quem ja tem parte do arquivo: lista os intervalos que faltam
+        pm = udp_node.pending_messages.pop((resume.msg_id, messages.MESSAGE), None)
+        if pm:
+            udp_node.resume_ranges[resume.msg_id] = resume.ranges
+            MessageHandler.acknowledge(pm, udp_node)
+
+    @staticmethod
+    def acknowledge(pm, udp_node, sample_rtt=True):
+        rtt = pm.acknowledge(sample_rtt)
+        if rtt is not None:
+            udp_node.metrics.observe("rtt_seconds", rtt)
+
+    @staticmethod
+    def reject_chunk(msg_id, seq, sender_ip, sender_port, udp_node):
+        # CHUNK com crc errado e descartado; emissores wire=2 sao avisados com NACK para reenviar
+        # na hora. Os antigos nao entendem o NACK de CHUNK e reenviam pelo timeout
+        log.debug(f"[CORROMPIDO] CHUNK {seq} de msg{msg_id}")
+        info = udp_node.active_devices.at(sender_ip, sender_port)
+        if (sender_ip, sender_port, msg_id) in received_chunks and info and info.wire_version >= 2:
+            udp_node.metrics.inc("nacks_out", "crc_invalido")
+            udp_node.send_udp(f"NACK msg{msg_id}-seq{seq} crc_invalido", sender_ip, sender_port)
+
+    @staticmethod
+    def make_entry(part_file, part_path, filename, filesize, chunk_size, fid, digest, hasher, last_seq=0, out_of_order=None):
+        # estado de um recebimento; todas as chaves nascem aqui (novo ou retomado). As do FILE
+        # (file_reply, fec, codec, sack_bitmap, chunk_acks) o handle_file preenche depois
+        now = time.monotonic()
+        return {"file": part_file, "part_path": part_path, "filename": filename, "filesize": filesize,
+                "chunk_size": chunk_size, "fid": fid, "recv_window": max(RECV_WINDOW_BYTES // chunk_size, 1),
+                "last_seq": last_seq, "out_of_order": {} if out_of_order is None else out_of_order,
+                "digest": digest, "hasher": hasher, "manifest_saved": now, "lock": threading.Lock(),
+                "unacked": 0, "sack_seq": 0, "last_activity": now, "file_reply": None, "fec": None,
+                "codec": None, "sack_bitmap": False, "chunk_acks": False}
+
+    @staticmethod
+    def new_entry(filename, filesize, chunk_size, fid=None, digest="md5"):
+        # os CHUNKs vao direto para o disco na posicao certa; o arquivo so ganha o nome final se o hash bater.
+        # Com fid o .part tem nome fixo, para ser achado de novo se o recebimento for retomado
+        if fid:
+            part_path = resume_manifest.part_path(filename, fid)
+            part_file = open(part_path, "w+b")
+        else:
+            fd, part_path = tempfile.mkstemp(prefix=f"recv_{filename}.", suffix=".part", dir=".")
+            part_file = os.fdopen(fd, "r+b")
+        part_file.truncate(filesize)
+        return MessageHandler.make_entry(part_file, part_path, filename, filesize, chunk_size, fid, digest, hashlib.new(digest))
+
+    @staticmethod
+    def resume_entry(filename, filesize, chunk_size, fid, digest="md5"):
+        # recebimento anterior do mesmo conteudo: ainda em memoria (o emissor desistiu e tentou de novo)
+        # ou so no disco (algum processo reiniciou). Retorna None se nao ha o que aproveitar
+        for key, file_entry in list(received_chunks.items()):
+            if file_entry["fid"] == fid and file_entry["filename"] == filename:
+                del received_chunks[key]
+                if file_entry["chunk_size"] == chunk_size and file_entry["digest"] == digest:
+                    return file_entry
+                file_entry["file"].close()  #CHUNK de outro tamanho (seqs nao batem) ou outro hash: recomeca
+        state = resume_manifest.load(filename, fid)
+        if (state is None or state["filesize"] != filesize or state["chunk_size"] != chunk_size
+                or state.get("digest", "md5") != digest):
+            return None
+        part_file = open(resume_manifest.part_path(filename, fid), "r+b")
+        #o hash do inicio se perdeu com o processo anterior: rele do disco (uma vez, na retomada)
+        hasher = hashlib.new(digest)
+        remaining = min(state["last_seq"] * chunk_size, filesize)
+        while remaining > 0:
+            block = part_file.read(min(remaining, 1024 * 1024))
+            hasher.update(block)
+            remaining -= len(block)
+        file_entry = MessageHandler.make_entry(part_file, resume_manifest.part_path(filename, fid), filename, filesize,
+                                               chunk_size, fid, digest, hasher, state["last_seq"],
+                                               dict.fromkeys(state["received"]))
+        MessageHandler.advance(file_entry)
+        return file_entry
+
+    @staticmethod
+    def advance(file_entry):
+        # avanca last_seq sobre os CHUNKs fora de ordem ja recebidos, alimentando o hash em ordem.
+        # Guardados como None estao so no disco (vieram do manifesto)
+        while file_entry["last_seq"] + 1 in file_entry["out_of_order"]:
+            file_entry["last_seq"] += 1
+            chunk_data = file_entry["out_of_order"].pop(file_entry["last_seq"])
+            if chunk_data is None:
+                file_entry["file"].seek((file_entry["last_seq"] - 1) * file_entry["chunk_size"])
+                chunk_data = file_entry["file"].read(file_entry["chunk_size"])
+            file_entry["hasher"].update(chunk_data)
+
+    @staticmethod
+    def handle_chunk(chunk, sender_ip, sender_port, udp_node):
+        # CHUNK ja decodificado, venha ele do formato texto (base64) ou binario
+        msg_id, seq, chunk_data = chunk.msg_id, chunk.seq, chunk.data
+        if chunk.corrupt:
+            MessageHandler.reject_chunk(msg_id, seq, sender_ip, sender_port, udp_node)
+            return
+        key = (sender_ip, sender_port, msg_id)
+        file_entry = received_chunks.get(key)
+        if file_entry is None:
+            return
+        with file_entry["lock"]:  #com --workers CHUNKs do mesmo arquivo chegam em threads diferentes
+            if file_entry["file"].closed:
+                return  #largado por expire_receives enquanto esperava o lock
+            file_entry["last_activity"] = time.monotonic()
+            if seq > file_entry["last_seq"] + file_entry["recv_window"]:
+                return  #fora da janela de recepcao, o emissor reenvia depois
+            #SACK na hora para duplicata (o anterior pode ter se perdido), fora de ordem ou buraco
+            #fechado: o emissor precisa saber logo. CHUNK em ordem espera (delayed_ack.py)
+            immediate = True
+            recovered = None
+            if seq <= file_entry["last_seq"] or seq in file_entry["out_of_order"]:
+                if log.level >= log.DEBUG:
                     print(f"[DUPLICADO] CHUNK {seq} já recebido, descartado")
-                    return  #ignora duplicata
-
-                if seq != file_entry["last_seq"] + 1:
-                    udp_node.send_udp(f"NACK {msg_id} fora_de_ordem_esperado_{file_entry['last_seq'] + 1}_recebido_{seq}", sender_ip, sender_port)
-                    print(f"[NACK enviado] CHUNK fora de ordem: esperado {file_entry['last_seq'] + 1}, recebido {seq}")
-                    return
-
-                file_entry["chunks"][seq] = chunk_data
-                file_entry["last_seq"] = seq
-                udp_node.send_udp(f"ACK {msg_id}-seq{seq}", sender_ip, sender_port)
-
-        elif cmd == "END" and len(parts) >= 3:
-            msg_id, received_hash = parts[1], parts[2]
-            if msg_id in received_chunks:
-                chunks = received_chunks[msg_id]["chunks"]
-                ordered = [chunks[i] for i in sorted(chunks)]
-                data = b"".join(ordered)
-                local_hash = hashlib.md5(data).hexdigest()
-                if local_hash == received_hash:
-                    filename = received_chunks[msg_id]["filename"]
-                    with open(f"recv_{filename}", "wb") as f:
-                        f.write(data)
-                    udp_node.send_udp(f"ACK {msg_id}", sender_ip, sender_port)
-                    print(f"[Arquivo salvo como recv_{filename}]")
+            elif seq >= 1 and (seq - 1) * file_entry["chunk_size"] < max(file_entry["filesize"], 1):
+                if chunk.compressed:
+                    try:
+                        chunk_data = compression.decompress(file_entry["codec"], chunk_data, file_entry["chunk_size"])
+                    except compression.CompressionError as e:
+                        log.debug(f"[DESCARTADO] CHUNK {seq} de {sender_ip}: {e}")
+                        return  #sem SACK: o emissor reenvia
+                file_entry["file"].seek((seq - 1) * file_entry["chunk_size"])
+                file_entry["file"].write(chunk_data)
+                if file_entry["fec"]:
+                    recovered = file_entry["fec"].add_chunk(seq, chunk_data)
+                #o hash e calculado em ordem: fora de ordem fica em memoria (no maximo RECV_WINDOW_BYTES) ate o buraco fechar
+                if seq == file_entry["last_seq"] + 1:
+                    immediate = bool(file_entry["out_of_order"])
+                    file_entry["hasher"].update(chunk_data)
+                    file_entry["last_seq"] = seq
+                    MessageHandler.advance(file_entry)
                 else:
-                    udp_node.send_udp(f"NACK {msg_id} hash_invalido", sender_ip, sender_port)
-                    print("[NACK enviado] Hash inválido no arquivo recebido")
-                del received_chunks[msg_id]
+                    file_entry["out_of_order"][seq] = bytes(chunk_data)
+                if file_entry["fid"] and time.monotonic() - file_entry["manifest_saved"] >= MANIFEST_INTERVAL:
+                    resume_manifest.save(file_entry)
+                    file_entry["manifest_saved"] = time.monotonic()
+            if file_entry["chunk_acks"]:
+                udp_node.send_udp(f"ACK msg{msg_id}-seq{seq}", sender_ip, sender_port)
+            file_entry["unacked"] += 1
+            file_entry["sack_seq"] = seq
+            complete = file_entry["last_seq"] * file_entry["chunk_size"] >= file_entry["filesize"]
+            if immediate or complete or file_entry["unacked"] >= ACK_EVERY:
+                MessageHandler.send_sack(file_entry, msg_id, sender_ip, sender_port, udp_node)
+            else:
+                udp_node.delayed_acks.defer(key)
+        if recovered:
+            MessageHandler.recover_chunk(recovered, msg_id, sender_ip, sender_port, udp_node)
+
+    @staticmethod
+    def handle_parity(parity, sender_ip, sender_port, udp_node):
+        # PARITY de um bloco (fec.py): se falta um CHUNK so no bloco, ele e reconstruido aqui
+        file_entry = received_chunks.get((sender_ip, sender_port, parity.msg_id))
+        if file_entry is None or file_entry["fec"] is None:
+            return
+        with file_entry["lock"]:
+            decoder, first = file_entry["fec"], parity.first_seq
+            last = min(first + decoder.k - 1, decoder.total_chunks)
+            if all(s <= file_entry["last_seq"] or s in file_entry["out_of_order"] for s in range(first, last + 1)):
+                return  #bloco ja completo
+            recovered = decoder.add_parity(first, parity.data)
+        if recovered:
+            MessageHandler.recover_chunk(recovered, parity.msg_id, sender_ip, sender_port, udp_node)
+
+    @staticmethod
+    def recover_chunk(recovered, msg_id, sender_ip, sender_port, udp_node):
+        # o CHUNK reconstruido segue o caminho de um recebido (e confirmado no SACK como ele)
+        seq, data = recovered
+        udp_node.metrics.inc("fec", "recuperado")
+        if log.level >= log.DEBUG:
+            print(f"[FEC] CHUNK {seq} de msg{msg_id} reconstruído pela paridade")
+        MessageHandler.handle_chunk(messages.Chunk(msg_id, seq, data, False, False), sender_ip, sender_port, udp_node)
+
+    @staticmethod
+    def expire_receives(now=None):
+        # recebimentos sem CHUNK ha RECV_IDLE_TIMEOUT (o emissor desistiu ou morreu): fecha o arquivo
+        # e apaga o .part. Com fid o .part e o manifesto ficam, para o proximo FILE retomar
+        now = time.monotonic() if now is None else now
+        for key, file_entry in list(received_chunks.items()):
+            if now - file_entry["last_activity"] < RECV_IDLE_TIMEOUT or received_chunks.pop(key, None) is None:
+                continue
+            with file_entry["lock"]:
+                if file_entry["fid"]:
+                    resume_manifest.save(file_entry)
+                file_entry["file"].close()
+                if not file_entry["fid"]:
+                    os.remove(file_entry["part_path"])
+            log.info(f"[INFO] Recebimento de {file_entry['filename']} abandonado (msg{key[2]} de {key[0]}:{key[1]})")
+
+    @staticmethod
+    def flush_acks(keys, udp_node):
+        # SACKs adiados cujo prazo venceu; o recebimento pode ter terminado ou ja ter sido confirmado
+        for key in keys:
+            file_entry = received_chunks.get(key)
+            if file_entry is None:
+                continue
+            with file_entry["lock"]:
+                if file_entry["unacked"]:
+                    sender_ip, sender_port, msg_id = key
+                    MessageHandler.send_sack(file_entry, msg_id, sender_ip, sender_port, udp_node)
+
+    @staticmethod
+    def send_sack(file_entry, msg_id, sender_ip, sender_port, udp_node):
+        # ACK cumulativo + blocos SACK, ou mapa de bits para wire=3; chamado com o lock da entrada
+        file_entry["unacked"] = 0
+        sack = f"SACK msg{msg_id} {file_entry['last_seq']}"
+        if file_entry["out_of_order"]:
+            if file_entry["sack_bitmap"]:
+                sack += f" m={sack_bitmap(file_entry['out_of_order'], file_entry['last_seq']):x}"
+            else:
+                blocks = sack_blocks(file_entry["out_of_order"], file_entry["sack_seq"])
+                sack += " " + ",".join(f"{start}-{end}" for start, end in blocks)
+        udp_node.send_udp(sack, sender_ip, sender_port)
+
 
-        elif cmd == "NACK" and len(parts) >= 3:
-            print(f"[NACK recebido] ID={parts[1]} Motivo={parts[2]}")
+for code, parse, handle in [
+        ("HEARTBEAT", messages.parse_heartbeat, MessageHandler.handle_heartbeat),
+        ("TALK", messages.parse_talk, MessageHandler.handle_talk),
+        ("ACK", messages.parse_ack, MessageHandler.handle_ack),
+        ("SACK", messages.parse_sack, MessageHandler.handle_sack),
+        ("FILE", messages.parse_file, MessageHandler.handle_file),
+        ("CHUNK", messages.parse_chunk, MessageHandler.handle_chunk),
+        ("END", messages.parse_end, MessageHandler.handle_end),
+        ("NACK", messages.parse_nack, MessageHandler.handle_nack),
+        ("RESUME", messages.parse_resume, MessageHandler.handle_resume),
+        (wire.TYPE_CHUNK, messages.parse_binary_chunk, MessageHandler.handle_chunk),
+        (wire.TYPE_PARITY, messages.parse_binary_parity, MessageHandler.handle_parity)]:
+    MessageHandler.register(code, parse, handle)
@@ -0,0 +1,170 @@
+import base64
+import binascii
+from collections import namedtuple
+import wire
+
+# Mensagens ja interpretadas: cada datagrama e lido uma vez so para um registro (namedtuple,
+# sem __dict__) e o handler do tipo trabalha com campos prontos.
+#
+# Ids: no texto continuam "msg12", "msg12-seq345" e "msg12-end" (nos antigos entendem assim);
+# dentro do no sao o numero da mensagem e a chave de pendente (msg, seq), seq MESSAGE para a
+# propria mensagem (TALK, FILE) e END para o END de uma transferencia.
+
+MESSAGE = 0
+END = -1
+
+Heartbeat = namedtuple("Heartbeat", "name wire_version interval codecs version node_id peers")  #peers: None fora do gossip
+Talk = namedtuple("Talk", "msg_id text")  #msg_id como veio: so volta no ACK
+Ack = namedtuple("Ack", "key")
+Sack = namedtuple("Sack", "msg_id cum_seq blocks bitmap")  #bitmap: bit i = seq cum_seq + 1 + i (wire=3)
+File = namedtuple("File", "msg_id filename filesize chunk_size fid digest codec fec")
+Chunk = namedtuple("Chunk", "msg_id seq data compressed corrupt")
+End = namedtuple("End", "msg_id file_hash")
+Nack = namedtuple("Nack", "key reason")
+Resume = namedtuple("Resume", "msg_id ranges")
+Parity = namedtuple("Parity", "msg_id first_seq data")
+Peer = namedtuple("Peer", "name ip port version wire_version interval node_id")
+
+
+def format_key(key):
+    # chave (msg, seq) -> id usado no texto
+    msg_id, seq = key
+    if seq == MESSAGE:
+        return f"msg{msg_id}"
+    if seq == END:
+        return f"msg{msg_id}-end"
+    return f"msg{msg_id}-seq{seq}"
+
+
+def parse_msg_id(text):
+    if not text.startswith("msg"):
+        raise ValueError(f"id de mensagem invalido: {text}")
+    return int(text[3:])
+
+
+def parse_key(text):
+    # "msg12-seq345" -> (12, 345); "msg12" -> (12, MESSAGE); "msg12-end" -> (12, END)
+    if not text.startswith("msg"):
+        raise ValueError(f"id de mensagem invalido: {text}")
+    msg, sep, seq = text[3:].partition("-seq")
+    if sep:
+        return int(msg), int(seq)
+    if msg.endswith("-end"):
+        return int(msg[:-4]), END
+    return int(msg), MESSAGE
+
+
+def format_peer(info):
+    # entrada do peers= (gossip): "nome@ip:porta/versao/wire/hb/id" (id vazio se nao anunciou)
+    return f"{info.name}@{info.ip}:{info.port}/{info.version}/{info.wire_version}/{info.heartbeat_interval:g}/{info.node_id}"
+
+
+def parse_peers(text):
+    # lista do peers=, separada por virgula (nomes com virgula nao vao no gossip); o nome pode ter @ e /
+    peers = []
+    for entry in filter(None, text.split(",")):
+        address, version, wire_version, interval, node_id = entry.rsplit("/", 4)
+        name, _, ip_port = address.rpartition("@")
+        ip, _, port = ip_port.rpartition(":")
+        if not name or not ip:
+            raise ValueError(f"entrada de peers= invalida: {entry}")
+        peers.append(Peer(name, ip, int(port), int(version), int(wire_version), float(interval), node_id))
+    return peers
+
+
+def parse_sack_blocks(text):
+    blocks = []
+    for block in text.split(","):
+        start, end = block.split("-")
+        blocks.append((int(start), int(end)))
+    return blocks
+
+
+# Parsers: recebem o resto da mensagem depois do tipo e retornam o registro, ou None se
+# faltam campos. Campo com valor invalido levanta ValueError (a mensagem e descartada)
+
+def parse_heartbeat(rest):
+    name, *option_tokens = rest.split()
+    options = wire.parse_options(option_tokens)
+    codecs = tuple(codec for codec in options.get("comp", "").split(",") if codec)
+    #nos antigos nao anunciam nada: so texto; hb= e o intervalo adaptado pelo emissor;
+    #v=, id= e peers= sao do gossip (membership.py)
+    peers = parse_peers(options["peers"]) if "peers" in options else None
+    return Heartbeat(name, int(options.get("wire", 0)), float(options.get("hb", 0)), codecs,
+                     int(options.get("v", 0)), options.get("id", ""), peers)
+
+
+def parse_talk(rest):
+    msg_id, _, text = rest.partition(" ")  #o texto pode ter espacos
+    return Talk(msg_id, text) if text else None
+
+
+def parse_ack(rest):
+    return Ack(parse_key(rest.partition(" ")[0]))
+
+
+def parse_sack(rest):
+    # "SACK msg12 300 310-315,320-320" (blocos) ou "SACK msg12 300 m=<hex>" (mapa de bits, wire=3)
+    parts = rest.split(" ")
+    if len(parts) < 2:
+        return None
+    blocks, bitmap = [], 0
+    if len(parts) > 2 and parts[2]:
+        if parts[2].startswith("m="):
+            bitmap = int(parts[2][2:], 16)
+        else:
+            blocks = parse_sack_blocks(parts[2])
+    return Sack(parse_msg_id(parts[0]), int(parts[1]), blocks, bitmap)
+
+
+def parse_file(rest):
+    parts = rest.split()
+    if len(parts) < 3:
+        return None
+    options = wire.parse_options(parts[3:])
+    return File(parse_msg_id(parts[0]), parts[1], int(parts[2]),
+                int(options["chunk"]) if "chunk" in options else None,  #sem chunk=: emissor antigo (CHUNK_SIZE)
+                options.get("fid"),  #hash do conteudo: com ele o recebimento pode ser retomado
+                options.get("digest", "md5"),  #sem digest=: emissor antigo, md5
+                options.get("comp"),  #CHUNKs com FLAG_COMPRESSED vem comprimidos com esse codec
+                int(options.get("fec", 0)))  #um PARITY a cada fec CHUNKs (0 = sem FEC)
+
+
+def parse_chunk(rest):
+    # CHUNK texto: dados em base64 e, de emissores wire=2, crc= (cobre msg_id e seq tambem)
+    parts = rest.split(" ")
+    if len(parts) < 3:
+        return None
+    msg_text, seq = parts[0], int(parts[1])
+    msg_id = parse_msg_id(msg_text)
+    try:
+        data = base64.b64decode(parts[2], validate=True)
+    except binascii.Error:
+        return Chunk(msg_id, seq, b"", False, True)
+    options = wire.parse_options(parts[3:])
+    corrupt = "crc" in options and wire.text_chunk_crc(msg_text, seq, data) != int(options["crc"], 16)
+    return Chunk(msg_id, seq, data, False, corrupt)
+
+
+def parse_end(rest):
+    parts = rest.split(" ")
+    return End(parse_msg_id(parts[0]), parts[1]) if len(parts) >= 2 else None
+
+
+def parse_nack(rest):
+    parts = rest.split(" ")
+    return Nack(parse_key(parts[0]), parts[1]) if len(parts) >= 2 else None
+
+
+def parse_resume(rest):
+    parts = rest.split(" ")
+    ranges = parse_sack_blocks(parts[1]) if len(parts) > 1 and parts[1] else []
+    return Resume(parse_msg_id(parts[0]), ranges)
+
+
+def parse_binary_chunk(flags, msg_id, seq, payload):
+    return Chunk(msg_id, seq, payload, bool(flags & wire.FLAG_COMPRESSED), False)
+
+
+def parse_binary_parity(flags, msg_id, seq, payload):
+    return Parity(msg_id, seq, payload)
@@ -0,0 +1,164 @@
+import bisect
+import json
+import os
+import threading
+import time
+import wire
+
+# Contadores e histogramas de um no: pacotes e bytes por tipo, reenvios, NACKs, RTT e vazao
+# das transferencias. Os valores do momento (fila de pendentes, dispositivos) sao gauges lidos
+# na hora do relatorio. Saida pelo comando stats e num arquivo JSON ou texto do Prometheus.
+
+PREFIX = "udp_node"
+TYPES = ("HEARTBEAT", "TALK", "ACK", "SACK", "FILE", "CHUNK", "END", "NACK", "RESUME")  #qualquer outro conta como "outro"
+NACK_REASONS = ("hash_invalido", "crc_invalido", "digest_desconhecido")  #motivos conhecidos; o resto conta como "outro"
+RTT_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)  #segundos
+THROUGHPUT_BUCKETS = (0.1, 0.5, 1, 5, 10, 25, 50, 100, 250, 500, 1000)  #MB/s
+
+# nome -> (descricao, nome do rotulo)
+COUNTERS = {
+    "packets_in": ("Datagramas recebidos por tipo", "type"),
+    "packets_out": ("Datagramas enviados por tipo", "type"),
+    "bytes_in": ("Bytes recebidos por tipo", "type"),
+    "bytes_out": ("Bytes enviados por tipo", "type"),
+    "retransmissions": ("Reenvios por motivo", "reason"),
+    "nacks_in": ("NACKs recebidos por motivo", "reason"),
+    "nacks_out": ("NACKs enviados por motivo", "reason"),
+    "transfers": ("Envios de arquivo por resultado", "result"),
+    "files_received": ("Arquivos recebidos por resultado", "result"),
+    "fec": ("CHUNKs reconstruidos com a paridade (FEC) no receptor", "result"),
+}
+HISTOGRAMS = {
+    "rtt_seconds": ("RTT das mensagens confirmadas sem reenvio", RTT_BUCKETS),
+    "transfer_mb_per_s": ("Vazao dos envios de arquivo concluidos", THROUGHPUT_BUCKETS),
+}
+
+
+# os 4 primeiros caracteres ja separam os tipos ("ACK " e "END " com o espaco): conta sem dividir a mensagem
+_PREFIXES = {f"{name} "[:4]: name for name in TYPES}
+_PREFIXES.update({prefix.encode(): name for prefix, name in _PREFIXES.items()})
+_BINARY_TYPES = {wire.TYPE_CHUNK: "CHUNK", wire.TYPE_PARITY: "PARITY"}
+
+
+def packet_type(data):
+    # tipo de um datagrama (str, bytes ou memoryview) para os rotulos
+    if not isinstance(data, str):
+        if wire.is_binary(data):
+            return _BINARY_TYPES.get(data[2], "outro") if len(data) > 2 else "outro"
+        data = bytes(data[:4])
+    return _PREFIXES.get(data[:4], "outro")
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  #o ultimo e o +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # limite do bucket onde cai o quantil q (aproximado, como no Prometheus)
+        if not self.count:
+            return None
+        target, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    def __init__(self):
+        self.counters = {name: {} for name in COUNTERS}  #nome -> {rotulo: valor}
+        self.histograms = {name: Histogram(buckets) for name, (_, buckets) in HISTOGRAMS.items()}
+        self.gauges = {}  #nome -> (descricao, funcao que le o valor atual)
+        self.lock = threading.Lock()  #com --workers varias threads contam ao mesmo tempo
+        self.started = time.time()
+        self._packets = {direction: (self.counters[f"packets_{direction}"], self.counters[f"bytes_{direction}"])
+                         for direction in ("in", "out")}
+
+    def inc(self, name, label="", value=1):
+        counter = self.counters[name]
+        with self.lock:
+            counter[label] = counter.get(label, 0) + value
+
+    def count_packet(self, direction, data):
+        # packets_<in|out> e bytes_<in|out> de um datagrama
+        kind = packet_type(data)
+        size = len(data)
+        packets, nbytes = self._packets[direction]
+        with self.lock:
+            packets[kind] = packets.get(kind, 0) + 1
+            nbytes[kind] = nbytes.get(kind, 0) + size
+
+    def observe(self, name, value):
+        with self.lock:
+            self.histograms[name].observe(value)
+
+    def gauge(self, name, description, func):
+        self.gauges[name] = (description, func)
+
+    def snapshot(self):
+        with self.lock:
+            counters = {name: dict(values) for name, values in self.counters.items()}
+            histograms = {name: {"buckets": dict(zip([*map(str, h.buckets), "+Inf"], h.counts)), "sum": h.sum, "count": h.count}
+                          for name, h in self.histograms.items()}
+        gauges = {name: func() for name, (_, func) in self.gauges.items()}
+        return {"timestamp": time.time(), "uptime_s": time.time() - self.started,
+                "counters": counters, "histograms": histograms, "gauges": gauges}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        # formato texto de exposicao do Prometheus (para o textfile collector do node_exporter)
+        snap = self.snapshot()
+        lines = []
+        for name, values in snap["counters"].items():
+            description, label_name = COUNTERS[name]
+            metric = f"{PREFIX}_{name}_total"
+            lines += [f"# HELP {metric} {description}", f"# TYPE {metric} counter"]
+            for label, value in sorted(values.items()):
+                lines.append(f'{metric}{{{label_name}="{label}"}} {value}')
+        for name, h in snap["histograms"].items():
+            metric = f"{PREFIX}_{name}"
+            lines += [f"# HELP {metric} {HISTOGRAMS[name][0]}", f"# TYPE {metric} histogram"]
+            cumulative = 0
+            for bound, count in h["buckets"].items():
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines += [f"{metric}_sum {h['sum']}", f"{metric}_count {h['count']}"]
+        for name, value in snap["gauges"].items():
+            metric = f"{PREFIX}_{name}"
+            lines += [f"# HELP {metric} {self.gauges[name][0]}", f"# TYPE {metric} gauge", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path, fmt="json"):
+        text = self.to_prometheus() if fmt == "prometheus" else self.to_json() + "\n"
+        with open(path + ".tmp", "w") as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)  #quem le o arquivo nunca ve metade de um dump
+
+    def report(self):
+        # linhas do comando stats
+        snap = self.snapshot()
+        lines = [f"ativo há {snap['uptime_s']:.0f} s"]
+        for name, value in snap["gauges"].items():
+            lines.append(f"{name}: {value}")
+        for name, values in snap["counters"].items():
+            if values:
+                detail = ", ".join(f"{label or '-'}={value}" for label, value in sorted(values.items()))
+                lines.append(f"{name}: {sum(values.values())} ({detail})")
+        with self.lock:
+            for name, h in self.histograms.items():
+                if h.count:
+                    lines.append(f"{name}: n={h.count} média={h.sum / h.count:.4g} p50<={h.quantile(0.5):g} p99<={h.quantile(0.99):g}")
+        return lines
@@ -0,0 +1,35 @@
+import socket
+import sys
+import wire
+
+DEFAULT_MTU = 1500
+IPV4_UDP_OVERHEAD = 20 + 8
+MAX_UDP_PAYLOAD = 65507
+TEXT_CHUNK_OVERHEAD = 44  #"CHUNK msg<id> <seq> " + " crc=xxxxxxxx", com id e seq de ate 10 digitos (uint32)
+
+# constantes do Linux (<linux/in.h>) que nem toda versao do Python exporta
+IP_MTU_DISCOVER = getattr(socket, "IP_MTU_DISCOVER", 10)
+IP_PMTUDISC_DO = getattr(socket, "IP_PMTUDISC_DO", 2)
+IP_MTU = getattr(socket, "IP_MTU", 14)
+
+
+def probe_path_mtu(ip, port, default=DEFAULT_MTU):
+    # MTU que o kernel conhece para a rota ate ip (MTU da interface ou o PMTU ja
+    # descoberto via ICMP). Em loopback da 65536, em link com jumbo frame 9000.
+    if not sys.platform.startswith("linux"):
+        return default
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_DO)
+            s.connect((ip, port))
+            return s.getsockopt(socket.IPPROTO_IP, IP_MTU)
+    except OSError:
+        return default
+
+
+def chunk_size_for_mtu(mtu, binary):
+    # quantos bytes de arquivo cabem num CHUNK sem fragmentar o datagrama IP
+    payload = min(mtu - IPV4_UDP_OVERHEAD, MAX_UDP_PAYLOAD)
+    if binary:
+        return payload - wire.HEADER.size
+    return (payload - TEXT_CHUNK_OVERHEAD) // 4 * 3  #base64: 4 caracteres para cada 3 bytes
@@ -1,14 +1,48 @@
 import time
 
 class PendingMessage:
-    def __init__(self, id, message, dest_ip, dest_port):
-        self.id = id
+    def __init__(self, id, message, dest_ip, dest_port, rtt):
+        self.id = id #chave (numero da mensagem, seq), ver messages.py
         self.message = message
         self.dest_ip = dest_ip
         self.dest_port = dest_port
-        self.last_sent = time.time()
+        self.last_sent = time.monotonic()
         self.acknowledged = False
-        self.retries = 0  
+        self.retries = 0
+        self.rtt = rtt #RttEstimator do destino
+        self.timeout = rtt.backoff_timeout(0)
+        self.max_retries = rtt.max_retries()
+        self.on_done = None #callback opcional on_done(confirmada), usado pela API assincrona
 
     def update_last_sent(self):
-        self.last_sent = time.time()
+        self.last_sent = time.monotonic()
+
+    @property
+    def deadline(self):
+        return self.last_sent + self.timeout
+
+    def backoff(self):
+        # chamado a cada reenvio: backoff exponencial a partir do RTO atual do destino
+        self.retries += 1
+        self.timeout = self.rtt.backoff_timeout(self.retries)
+        self.update_last_sent()
+
+    def resend(self):
+        # reenvio imediato a pedido do receptor: conta a tentativa mas mantem o timeout
+        self.retries += 1
+        self.update_last_sent()
+
+    def acknowledge(self, sample_rtt=True):
+        # retorna a amostra de RTT, ou None se a mensagem foi reenviada ou sample_rtt=False
+        self.acknowledged = True
+        sample = None
+        if self.retries == 0 and sample_rtt:  #algoritmo de Karn: nao amostra mensagens reenviadas
+            sample = time.monotonic() - self.last_sent
+            self.rtt.sample(sample)
+        if self.on_done:
+            self.on_done(True)
+        return sample
+
+    def give_up(self):
+        if self.on_done:
+            self.on_done(False)
@@ -0,0 +1,83 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from message_handler import MessageHandler
+
+# Etapas com filas limitadas entre elas, para envio e recepcao rodarem em paralelo
+# (md5, crc32 e zlib liberam o GIL em blocos grandes). Cada fila e uma Stage que guarda a
+# profundidade atual e a maxima: a etapa seguinte a uma fila sempre cheia e o gargalo.
+
+
+class Stage:
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self.queue = queue.Queue(maxsize)
+        self.items = 0
+        self.max_depth = 0
+        self.full = 0  #vezes que quem produz encontrou a fila cheia e teve que esperar
+
+    def put(self, item):
+        if self.queue.full():
+            self.full += 1
+        self.queue.put(item)
+        self.items += 1
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def get(self):
+        return self.queue.get()
+
+    def drain(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def report(self):
+        return (f"{self.name}: fila {self.queue.qsize()}/{self.maxsize} (máx {self.max_depth}), "
+                f"{self.items} itens, cheia {self.full}x")
+
+
+def ordered_map(func, items, workers, stage):
+    # func(item) em `workers` threads, entregando os resultados na ordem de `items`. Uma
+    # thread le `items` (ex.: CHUNKs do disco) e a `stage` limita quanto ela anda a frente do consumidor
+    executor = ThreadPoolExecutor(workers)
+    stopped = threading.Event()
+
+    def feed():
+        for item in items:
+            if stopped.is_set():
+                break
+            stage.put(executor.submit(func, item))
+        stage.put(None)
+
+    threading.Thread(target=feed, daemon=True).start()
+    try:
+        while (future := stage.get()) is not None:
+            yield future.result()
+    finally:
+        stopped.set()  #consumidor parou antes do fim: destrava a leitura se ela estiver esperando a fila
+        stage.drain()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ReceivePipeline:
+    # listen_loop so tira os datagramas do socket e enfileira; os workers decodificam, conferem e
+    # gravam. Cada emissor (ip, porta) cai sempre no mesmo worker: o estado de uma transferencia
+    # (received_chunks) nunca e mexido por duas threads e a ordem de chegada por emissor se mantem
+    def __init__(self, node, workers, depth):
+        self.node = node
+        self.stages = [Stage(f"recepção[{i}]", depth) for i in range(workers)]
+        for stage in self.stages:
+            threading.Thread(target=self._worker, args=(stage,), daemon=True).start()
+
+    def dispatch(self, data, sender_ip, sender_port):
+        # data pode ser memoryview sobre o buffer do receiver: copia antes de enfileirar
+        stage = self.stages[hash((sender_ip, sender_port)) % len(self.stages)]
+        stage.put((bytes(data), sender_ip, sender_port))
+
+    def _worker(self, stage):
+        while True:
+            data, sender_ip, sender_port = stage.get()
+            MessageHandler.handle_datagram(data, sender_ip, sender_port, self.node)
@@ -0,0 +1,61 @@
+import json
+import os
+
+# Estado em disco de um recebimento retomavel (FILE com fid=): quais CHUNKs ja estao no
+# arquivo .part. Se o emissor desistir ou algum dos processos reiniciar, o proximo FILE com
+# o mesmo fid continua de onde parou e o receptor responde RESUME com o que falta.
+# O manifesto e gravado depois do flush do .part, entao nunca diz que tem mais do que o
+# arquivo tem (pode dizer menos: esses CHUNKs sao so reenviados).
+
+MAX_RESUME_RANGES = 64  #intervalos no RESUME; o resto vira um intervalo so ate o fim (reenvia alguns a mais)
+
+
+def part_path(filename, fid):
+    return f"recv_{filename}.{fid}.part"
+
+
+def manifest_path(filename, fid):
+    return f"recv_{filename}.{fid}.manifest"
+
+
+def save(entry):
+    entry["file"].flush()
+    state = {"filename": entry["filename"], "filesize": entry["filesize"], "chunk_size": entry["chunk_size"],
+             "fid": entry["fid"], "digest": entry["digest"], "last_seq": entry["last_seq"], "received": sorted(entry["out_of_order"])}
+    path = manifest_path(entry["filename"], entry["fid"])
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)  #troca atomica: um processo morto no meio deixa o manifesto anterior
+
+
+def load(filename, fid):
+    # retorna o estado salvo, ou None se nao ha (ou o .part sumiu)
+    path = manifest_path(filename, fid)
+    if not os.path.exists(path) or not os.path.exists(part_path(filename, fid)):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def remove(filename, fid):
+    for path in (manifest_path(filename, fid), manifest_path(filename, fid) + ".tmp"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def missing_ranges(last_seq, received, total_chunks):
+    # intervalos [inicio, fim] de seqs que faltam acima de last_seq, sem os ja recebidos
+    ranges = []
+    start = last_seq + 1
+    for seq in sorted(received):
+        if seq > start:
+            ranges.append((start, seq - 1))
+        start = max(start, seq + 1)
+    if start <= total_chunks:
+        ranges.append((start, total_chunks))
+    if len(ranges) > MAX_RESUME_RANGES:
+        ranges = ranges[:MAX_RESUME_RANGES - 1] + [(ranges[MAX_RESUME_RANGES - 1][0], total_chunks)]
+    return ranges
@@ -0,0 +1,102 @@
+import heapq
+import itertools
+import threading
+import time
+
+class RetransmitQueue:
+    # Mensagens pendentes (id -> PendingMessage) + heap ordenado pelo prazo de reenvio.
+    # Remover (ACK) e O(1): a entrada velha fica no heap e e descartada quando chega
+    # ao topo (remocao preguiçosa). Tudo protegido pelo mesmo lock/condition.
+    def __init__(self, on_earlier_deadline=None):
+        self.messages = {}
+        self.heap = []  #(prazo, desempate, pm)
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.on_earlier_deadline = on_earlier_deadline #avisa quem espera fora do Condition (ex.: asyncio)
+
+    def __setitem__(self, id, pm):
+        with self.cond:
+            self.messages[id] = pm
+            self._push(pm)
+
+    def __getitem__(self, id):
+        with self.cond:
+            return self.messages[id]
+
+    def __delitem__(self, id):
+        with self.cond:
+            del self.messages[id]
+
+    def __contains__(self, id):
+        with self.cond:
+            return id in self.messages
+
+    def __len__(self):
+        with self.cond:
+            return len(self.messages)
+
+    def get(self, id, default=None):
+        with self.cond:
+            return self.messages.get(id, default)
+
+    def pop(self, id, default=None):
+        with self.cond:
+            return self.messages.pop(id, default)
+
+    def pop_many(self, ids):
+        # varias de uma vez (um SACK confirma ate uma janela inteira): um lock so
+        with self.cond:
+            popped = (self.messages.pop(id, None) for id in ids)
+            return [pm for pm in popped if pm]
+
+    def schedule(self, pm):
+        # reagenda depois de um reenvio (o prazo mudou com o backoff)
+        with self.cond:
+            if self.messages.get(pm.id) is pm:
+                self._push(pm)
+
+    def pop_due(self, now):
+        # retira do heap as mensagens vencidas; elas continuam pendentes ate ACK,
+        # desistencia ou novo schedule()
+        due = []
+        with self.cond:
+            while self.heap and self.heap[0][0] <= now:
+                deadline, _, pm = heapq.heappop(self.heap)
+                if self._is_live(deadline, pm):
+                    due.append(pm)
+        return due
+
+    def next_deadline(self):
+        with self.cond:
+            return self._next_deadline()
+
+    def wait_due(self):
+        # bloqueia ate a proxima mensagem vencer (ou uma nova com prazo menor entrar)
+        with self.cond:
+            while True:
+                due = self.pop_due(time.monotonic())
+                if due:
+                    return due
+                deadline = self._next_deadline()
+                self.cond.wait(None if deadline is None else deadline - time.monotonic())
+
+    def _next_deadline(self):
+        while self.heap and not self._is_live(self.heap[0][0], self.heap[0][2]):
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def _is_live(self, deadline, pm):
+        # entrada valida: mensagem ainda pendente e com esse mesmo prazo
+        return self.messages.get(pm.id) is pm and deadline == pm.deadline
+
+    def _push(self, pm):
+        if len(self.heap) > 2 * len(self.messages) + 64:
+            #muitas entradas mortas (ACKs): reconstroi so com as vivas
+            self.heap = [entry for entry in self.heap if self._is_live(entry[0], entry[2])]
+            heapq.heapify(self.heap)
+        wakeup = not self.heap or pm.deadline < self.heap[0][0]
+        heapq.heappush(self.heap, (pm.deadline, next(self.counter), pm))
+        if wakeup:
+            self.cond.notify_all()
+            if self.on_earlier_deadline:
+                self.on_earlier_deadline()
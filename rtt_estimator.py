@@ -0,0 +1,41 @@
+# Estimativa de RTT por destino no estilo Jacobson/Karels (RFC 6298)
+
+ALPHA = 1 / 8
+BETA = 1 / 4
+K = 4
+INITIAL_RTO = 1.0  #antes da primeira amostra
+MIN_RTO = 0.05  #o RFC usa 1s, mas aqui a ideia e recuperar rapido em LAN
+MAX_RTO = 8.0  #teto do backoff exponencial
+RETRY_BUDGET = 20.0  #tempo total (s) de tentativas antes de desistir de uma mensagem
+MIN_RETRIES = 2
+MAX_RETRIES = 16
+
+
+class RttEstimator:
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = None
+        self.rto = INITIAL_RTO
+
+    def sample(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - BETA) * self.rttvar + BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - ALPHA) * self.srtt + ALPHA * rtt
+        self.rto = min(max(self.srtt + K * self.rttvar, MIN_RTO), MAX_RTO)
+
+    def backoff_timeout(self, retries):
+        # timeout depois de `retries` reenvios: dobra a cada tentativa ate MAX_RTO
+        return min(self.rto * (2 ** retries), MAX_RTO)
+
+    def max_retries(self):
+        # quantos reenvios cabem em RETRY_BUDGET com o RTO atual:
+        # rede rapida -> mais tentativas curtas, rede lenta -> menos tentativas longas
+        total = self.backoff_timeout(0)
+        retries = 0
+        while retries < MAX_RETRIES and total + self.backoff_timeout(retries + 1) <= RETRY_BUDGET:
+            retries += 1
+            total += self.backoff_timeout(retries)
+        return max(retries, MIN_RETRIES)
@@ -0,0 +1,51 @@
+import threading
+
+class SendWindow:
+    # Janela deslizante do lado do emissor (selective repeat):
+    # no maximo `size` CHUNKs em voo (enviados e ainda nao confirmados)
+    def __init__(self, msg_id, size):
+        self.msg_id = msg_id
+        self.size = size
+        self.in_flight = set()
+        self.failed = False
+        self.cond = threading.Condition()
+
+    def acquire(self, seq):
+        # bloqueia ate haver espaço na janela; retorna False se a transferencia falhou
+        with self.cond:
+            while len(self.in_flight) >= self.size and not self.failed:
+                self.cond.wait()
+            if self.failed:
+                return False
+            self.in_flight.add(seq)
+            return True
+
+    def has_room(self):
+        # so o emissor ocupa a janela e ACKs so liberam: se tem espaco agora, acquire() nao bloqueia
+        with self.cond:
+            return len(self.in_flight) < self.size and not self.failed
+
+    def ack(self, cum_seq, ranges, bitmap=0):
+        # ACK cumulativo (todos seq <= cum_seq) + blocos SACK [(inicio, fim), ...]
+        # ou mapa de bits (bit i = seq cum_seq + 1 + i)
+        with self.cond:
+            acked = {seq for seq in self.in_flight
+                     if seq <= cum_seq or (bitmap >> (seq - cum_seq - 1)) & 1}
+            for start, end in ranges:
+                acked.update(seq for seq in self.in_flight if start <= seq <= end)
+            self.in_flight -= acked
+            if acked:
+                self.cond.notify_all()
+            return acked
+
+    def fail(self):
+        with self.cond:
+            self.failed = True
+            self.cond.notify_all()
+
+    def wait_drained(self):
+        # espera todos os CHUNKs serem confirmados antes de mandar o END
+        with self.cond:
+            while self.in_flight and not self.failed:
+                self.cond.wait()
+            return not self.failed
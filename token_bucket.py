@@ -0,0 +1,25 @@
+import threading
+import time
+
+class TokenBucket:
+    # Limitador de taxa em bytes/s. rate=0 desliga o limite.
+    # consume() deixa o saldo ficar negativo e dorme o tempo da divida, entao
+    # datagramas maiores que o burst tambem passam e a taxa media fica certa.
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate / 10, 65536)
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
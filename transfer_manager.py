@@ -0,0 +1,86 @@
+import itertools
+import os
+import queue
+import threading
+import traceback
+from token_bucket import TokenBucket
+
+class Transfer:
+    def __init__(self, id, targets, file_path):
+        self.id = id
+        self.targets = targets
+        self.file_path = file_path
+        self.file_size = os.path.getsize(file_path)
+        self.sent = {target: 0 for target in targets} #bytes do arquivo ja enviados por destino (como digitado)
+        self.status = "na fila"
+
+
+class TransferManager:
+    # Fila de envios de arquivo rodando em segundo plano (fora da thread do console),
+    # ate max_concurrent ao mesmo tempo, com limite de taxa global e por destino.
+    def __init__(self, node, max_concurrent=4, global_rate=0, peer_rate=0):
+        self.node = node
+        self.max_concurrent = max_concurrent
+        self.global_bucket = TokenBucket(global_rate)
+        self.peer_rate = peer_rate
+        self.peer_buckets = {} #(ip, porta) -> TokenBucket
+        self.queue = queue.Queue()
+        self.transfers = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.started = False
+
+    def start(self):
+        if self.started:
+            return
+        self.started = True
+        for _ in range(self.max_concurrent):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def submit(self, targets, file_path):
+        if not os.path.isfile(file_path):
+            print("[ERRO] Arquivo não encontrado:", file_path)
+            return None
+        transfer = Transfer(next(self.ids), targets, file_path)
+        with self.lock:
+            self.transfers[transfer.id] = transfer
+        self.queue.put(transfer)
+        print(f"[FILA] Transferência #{transfer.id}: {file_path} -> {', '.join(targets)}")
+        return transfer
+
+    def pace(self, info, nbytes):
+        # chamado antes de cada CHUNK enviado
+        self.global_bucket.consume(nbytes)
+        if self.peer_rate:
+            with self.lock:
+                bucket = self.peer_buckets.setdefault((info.ip, info.port), TokenBucket(self.peer_rate))
+            bucket.consume(nbytes)
+
+    def report(self):
+        print("=== Transferências ===")
+        with self.lock:
+            transfers = list(self.transfers.values())
+        for transfer in transfers:
+            print(f"#{transfer.id} {transfer.file_path} [{transfer.status}]")
+            for target, sent in transfer.sent.items():
+                percent = 100 * sent / transfer.file_size if transfer.file_size else 100
+                print(f"    {target}: {sent}/{transfer.file_size} bytes ({percent:.0f}%)")
+        print("======================")
+
+    def _worker(self):
+        while True:
+            transfer = self.queue.get()
+            transfer.status = "enviando"
+            #nenhum erro de um envio pode matar o worker: os proximos da fila ficariam parados
+            try:
+                ok = self.node.send_file_multi(transfer.targets, transfer.file_path, pace=self.pace,
+                                               progress=transfer.sent.__setitem__)
+            except OSError as e:  #arquivo removido ou ilegivel depois do submit
+                print(f"[ERRO] Transferência #{transfer.id}: {e}")
+                ok = False
+            except Exception:
+                print(f"[ERRO] Transferência #{transfer.id}: erro inesperado")
+                traceback.print_exc()
+                ok = False
+            transfer.status = "concluída" if ok else "falhou"
+            print(f"[INFO] Transferência #{transfer.id} {transfer.status}")
@@ -1,79 +1,212 @@
 import socket
 import threading
 import time
-import base64
 import os
-import hashlib
 import argparse
+import random
 from pending_message import PendingMessage
-from device_info import DeviceInfo
+from device_registry import DeviceRegistry
 from message_handler import MessageHandler
+from send_window import SendWindow
+from rtt_estimator import RttEstimator
+from retransmit_queue import RetransmitQueue
+from delayed_ack import DelayedAcks
+from file_transfer import FileTransfer, FileReader, SeqRanges, CHUNK_SIZE, RESUME_MIN_SIZE, DIGESTS, file_id
+from transfer_manager import TransferManager
+from fec import ParityEncoder
+from membership import Membership, parse_address
+import path_mtu
+import batch_io
+import compression
+import pipeline
+import wire
+import log
+import messages
+import metrics
 
-HEARTBEAT_INTERVAL = 5
+HEARTBEAT_INTERVAL = 5 #intervalo minimo; cresce com o numero de dispositivos (MAX_HEARTBEAT_RATE)
+HEARTBEAT_JITTER = 0.2 #cada intervalo e sorteado em +-20%, para nos ligados juntos nao baterem ao mesmo tempo
+MAX_HEARTBEAT_RATE = 100 #HEARTBEATs/s que cada no deve receber no maximo, somando todos os outros
 DEVICE_TIMEOUT = 10
 CLEANUP_INTERVAL = 2
-RESEND_INTERVAL = 2
 PORT = 11000
-MAX_RETRY = 5 #maximo numero de tentativas de reenvio
-message_counter = 0
+WINDOW_SIZE = 64 #maximo de CHUNKs em voo por transferencia
+MAX_DATAGRAM = 65535 #buffer de recepcao: cabe qualquer CHUNK negociado, ate jumbo/loopback
+SEND_BATCH = 16 #CHUNKs por lote de envio
+SEND_MMSG = False #sendmmsg via ctypes nao ganhou de sendto no CPython (benchmarks/bench_batch_io.py)
+SOCKET_RCVBUF = 4 * 1024 * 1024 #buffer do kernel para aguentar uma janela inteira de CHUNKs grandes
+PIPELINE_DEPTH = 256 #itens em cada fila entre etapas do pipeline (--workers)
+METRICS_INTERVAL = 10 #segundos entre gravacoes do --metrics-file
+#ids sorteados a partir de um ponto por processo: um no reiniciado nao repete os ids recentes, que o
+#receptor ainda lembra por (ip, porta, id). Sobra 2^31 ate o limite do uint32 do formato binario
+message_counter = random.getrandbits(31)
+message_counter_lock = threading.Lock()
 
 class UdpNode:
-    def __init__(self, device_name, listen_port=11000, dest_ip="255.255.255.255", dest_port=11000): #dest_port é só para caso queira falar entre processos diretamente (tem que mudar a porta padrão tmb)
+    def __init__(self, device_name, listen_port=11000, dest_ip="255.255.255.255", dest_port=11000, *, window_size=WINDOW_SIZE, wire_format="binary", mtu=None, max_transfers=4, global_rate=0, peer_rate=0, compression_codec=None, compression_level=None, workers=0, digest="sha256", metrics_file=None, metrics_format="json", fec=0, seeds=()): #dest_port é só para caso queira falar entre processos diretamente (tem que mudar a porta padrão tmb)
         self.device_name = device_name
         self.dest_ip = dest_ip
         self.dest_port = dest_port
-        self.active_devices = {}
-        self.pending_messages = {}
+        self.window_size = window_size
+        self.wire_format = wire_format #"binary" usa o formato binario com quem anunciar suporte, "text" força o legado
+        self.active_devices = DeviceRegistry(DEVICE_TIMEOUT)
+        self.membership = Membership(self, seeds) #gossip e sementes, para quem o broadcast nao alcanca
+        self.pending_messages = RetransmitQueue()
+        self.delayed_acks = DelayedAcks() #SACKs adiados dos arquivos que estamos recebendo
+        self.send_windows = {} #numero da mensagem -> SendWindow das transferencias em andamento
+        self.resume_ranges = {} #numero da mensagem do FILE -> intervalos que faltam, vindos no RESUME
+        self.rtt_estimators = {} #(ip, porta) -> RttEstimator
+        self.mtu = mtu #None: descobre o MTU do caminho por destino
+        self.path_mtus = {} #ip -> MTU descoberto
+        self.compressor = compression.Compressor(compression_codec, compression_level) if compression_codec else None
+        self.digest = digest #hash do END com quem anuncia wire>=2; com os antigos continua md5
+        self.fec = fec #um PARITY a cada fec CHUNKs para quem anuncia wire>=4 (0 = sem FEC)
+        self.transfer_manager = TransferManager(self, max_transfers, global_rate, peer_rate)
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.socket.bind(('', listen_port))
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        self.lock = threading.Lock()
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_RCVBUF)
+        #criados no start_services: o buffer do receiver (32 x MAX_DATAGRAM) so serve para o listen_loop,
+        #e o AsyncUdpNode (centenas por processo) recebe pelo asyncio
+        self.receiver = None #recvmmsg no Linux, recvfrom_into nos outros
+        self.sender = None
+        self.datagrams_received = 0
+        self.retransmissions = 0
+        self.last_sent = {} #(ip, porta) -> quando mandamos algo pela ultima vez (suprime HEARTBEAT unicast)
+        self.last_heartbeat_sent = float("-inf")
+        #workers=0: tudo na thread que le o socket/arquivo (sem copias); >0: pipeline em etapas
+        self.workers = workers
+        self.receive_pipeline = pipeline.ReceivePipeline(self, workers, PIPELINE_DEPTH) if workers else None
+        self.send_stages = [] #filas dos envios de arquivo em andamento, para o comando pipeline
+        self.metrics = metrics.Metrics()
+        self.metrics.gauge("pending_messages", "Mensagens esperando ACK", lambda: len(self.pending_messages))
+        self.metrics.gauge("devices", "Dispositivos ativos", lambda: len(self.active_devices))
+        self.metrics.gauge("active_transfers", "Envios de arquivo em andamento", lambda: len(self.send_windows))
+        self.metrics_file = metrics_file #None: metricas so no comando stats
+        self.metrics_format = metrics_format #"json" ou "prometheus"
 
     def start(self, dest_ip, listen_port):
-        threading.Thread(target=self.listen_loop, daemon=True).start()
-        self._schedule(lambda: self.send_heartbeat(dest_ip, listen_port), HEARTBEAT_INTERVAL)
-        self._schedule(self.cleanup_inactive_devices, CLEANUP_INTERVAL)
-        self._schedule(self.resend_pending_messages, RESEND_INTERVAL)
-        self.send_heartbeat(dest_ip, listen_port)
+        self.start_services(dest_ip, listen_port)
         self.console_loop()
-        
+
+    def start_services(self, dest_ip, listen_port, heartbeat=True):
+        # tudo menos o console (usado tambem pelos benchmarks)
+        self.receiver = batch_io.BatchReceiver(self.socket, bufsize=MAX_DATAGRAM)
+        self.sender = batch_io.BatchSender(self.socket, use_mmsg=SEND_MMSG)
+        threading.Thread(target=self.listen_loop, daemon=True).start()
+        threading.Thread(target=self.retransmit_loop, daemon=True).start()
+        threading.Thread(target=self.ack_loop, daemon=True).start()
+        self.transfer_manager.start()
+        if heartbeat:
+            threading.Thread(target=self.heartbeat_loop, args=(dest_ip, listen_port), daemon=True).start()
+            threading.Thread(target=self.gossip_loop, daemon=True).start()
+            self._schedule(self.cleanup_inactive_devices, CLEANUP_INTERVAL)
+        if self.metrics_file:
+            self._schedule(self.dump_metrics, METRICS_INTERVAL)
+
     def listen_loop(self):
         while True:
-            data, addr = self.socket.recvfrom(8192)
-            message = data.decode('utf-8')
-            sender_ip, sender_port = addr
-            MessageHandler.handle_message(message, sender_ip, sender_port, self)
+            #data e um memoryview sobre o buffer do receiver: o handler consome na hora ou copia
+            received = self.receiver.recv()
+            self.datagrams_received += len(received)
+            if self.receive_pipeline:
+                for data, (sender_ip, sender_port) in received:
+                    self.receive_pipeline.dispatch(data, sender_ip, sender_port)
+                continue
+            for data, (sender_ip, sender_port) in received:
+                MessageHandler.handle_datagram(data, sender_ip, sender_port, self)
 
     def send_udp(self, message, dest_ip, dest_port):
-        self.socket.sendto(message.encode('utf-8'), (dest_ip, dest_port))
+        if isinstance(message, str):
+            message = message.encode('utf-8')
+        self.socket.sendto(message, (dest_ip, dest_port))
+        self.last_sent[(dest_ip, dest_port)] = time.monotonic()
+        self.metrics.count_packet("out", message)
+
+    def send_batch(self, batch):
+        # batch: [(bytes, ip, porta), ...] -> um sendmmsg quando disponivel
+        self.sender.send([(message, (dest_ip, dest_port)) for message, dest_ip, dest_port in batch])
+        now = time.monotonic()
+        for message, dest_ip, dest_port in batch:
+            self.last_sent[(dest_ip, dest_port)] = now
+            self.metrics.count_packet("out", message)
+
+    def heartbeat_interval(self):
+        # com N dispositivos cada no recebe N/intervalo HEARTBEATs por segundo: o intervalo
+        # cresce para manter isso abaixo de MAX_HEARTBEAT_RATE. Todos veem mais ou menos o
+        # mesmo N, entao convergem para o mesmo intervalo, que vai no hb= para quem recebe
+        return max(HEARTBEAT_INTERVAL, (len(self.active_devices) + 1) / MAX_HEARTBEAT_RATE)
+
+    def heartbeat_message(self):
+        return (f"HEARTBEAT {self.device_name} wire={wire.WIRE_VERSION} hb={self.heartbeat_interval():g} "
+                f"comp={','.join(compression.SUPPORTED)} v={self.membership.next_version()} id={self.membership.node_id}")
 
     def send_heartbeat(self, dest_ip, listen_port):
-        msg = f"HEARTBEAT {self.device_name}"
-        self.send_udp(msg, dest_ip, listen_port)
+        self.send_udp(self.heartbeat_message(), dest_ip, listen_port)
+        self.last_heartbeat_sent = time.monotonic()
+
+    def heartbeat_tick(self, dest_ip, listen_port):
+        # manda o HEARTBEAT se preciso e retorna quanto esperar ate o proximo.
+        # Qualquer pacote conta como sinal de vida para quem recebe, entao se mandamos outra coisa
+        # para esse destino desde o ultimo HEARTBEAT, e dentro do intervalo, ele e suprimido
+        # (so acontece com destino unicast: para o broadcast so vai HEARTBEAT)
+        interval = self.heartbeat_interval()
+        sent = self.last_sent.get((dest_ip, listen_port), float("-inf"))
+        if not (sent > self.last_heartbeat_sent and time.monotonic() - sent < interval):
+            self.send_heartbeat(dest_ip, listen_port)
+        return interval * random.uniform(1 - HEARTBEAT_JITTER, 1 + HEARTBEAT_JITTER)
+
+    def heartbeat_loop(self, dest_ip, listen_port):
+        while True:
+            time.sleep(self.heartbeat_tick(dest_ip, listen_port))
+
+    def gossip_loop(self):
+        while True:
+            time.sleep(self.membership.tick())
 
     def cleanup_inactive_devices(self):
-        now = time.time()
-        with self.lock:
-            to_remove = [name for name, info in self.active_devices.items()
-                         if now - info.last_heartbeat > DEVICE_TIMEOUT]
-            for name in to_remove:
-                print(f">>> [INFO] Dispositivo inativo removido: {name}")
-                del self.active_devices[name]
-
-    def resend_pending_messages(self):
-        now = time.time()
-        for pm_id, pm in list(self.pending_messages.items()):
+        for info in self.active_devices.expire():
+            log.info(f">>> [INFO] Dispositivo inativo removido: {info.name}")
+        MessageHandler.expire_receives()
+
+    def retransmit_loop(self):
+        while True:
+            self.resend_pending_messages(self.pending_messages.wait_due())
+
+    def ack_loop(self):
+        while True:
+            MessageHandler.flush_acks(self.delayed_acks.wait_due(), self)
+
+    def resend_pending_messages(self, due):
+        for pm in due:
             if pm.acknowledged:
                 continue
-            if now - pm.last_sent > 3:
-                if pm.retries >= MAX_RETRY:  #depois de 5 tentativas, joga o erro e desiste
-                    print(f"[ERRO] Falha ao enviar mensagem ID={pm.id} após múltiplas tentativas")
-                    del self.pending_messages[pm_id]
-                    continue
-                print(f"[RETX] Reenviando ID={pm.id} (tentativa {pm.retries + 1})")
-                self.send_udp(pm.message, pm.dest_ip, pm.dest_port)
-                pm.update_last_sent()
-                pm.retries += 1
+            if pm.retries >= pm.max_retries:  #estourou o orçamento de tentativas, joga o erro e desiste
+                print(f"[ERRO] Falha ao enviar mensagem ID={messages.format_key(pm.id)} após múltiplas tentativas")
+                self.pending_messages.pop(pm.id)
+                pm.give_up()
+                window = self.send_windows.get(pm.id[0])
+                if window:
+                    window.fail()
+                continue
+            if log.level >= log.DEBUG:
+                print(f"[RETX] Reenviando ID={messages.format_key(pm.id)} (tentativa {pm.retries + 1})")
+            self.retransmissions += 1
+            self.metrics.inc("retransmissions", "timeout")
+            self.send_udp(pm.message, pm.dest_ip, pm.dest_port)
+            pm.backoff()
+            self.pending_messages.schedule(pm)
+
+    def resend_now(self, pm):
+        # reenvio pedido pelo receptor (NACK de CHUNK corrompido): nao foi perda, entao sem backoff
+        if pm.acknowledged or pm.retries >= pm.max_retries:
+            return
+        log.debug(f"[RETX] Reenviando ID={messages.format_key(pm.id)} (corrompido)")
+        self.retransmissions += 1
+        self.metrics.inc("retransmissions", "nack")
+        self.send_udp(pm.message, pm.dest_ip, pm.dest_port)
+        pm.resend()
+        self.pending_messages.schedule(pm)
 
     def console_loop(self):
         while True:
@@ -90,77 +223,251 @@ class UdpNode:
                         target, msg = parts[1].split(" ", 1)
                         self.send_talk(target, msg)
                     except ValueError:
-                        print("Uso: talk <nome> <mensagem>")
+                        print("Uso: talk <nome>[@ip:porta] <mensagem>")
                 else:
-                    print("Uso: talk <nome> <mensagem>")
+                    print("Uso: talk <nome>[@ip:porta] <mensagem>")
             elif cmd == "sendfile":
+                #roda em segundo plano pelo TransferManager; varios destinos separados por virgula
                 if len(parts) > 1:
                     try:
-                        target, path = parts[1].split(" ", 1)
-                        self.send_file(target, path)
+                        targets, path = parts[1].split(" ", 1)
+                        self.transfer_manager.submit(targets.split(","), path)
                     except ValueError:
-                        print("Uso: sendfile <nome> <caminho-arquivo>")
+                        print("Uso: sendfile <nome>[@ip:porta][,<nome>...] <caminho-arquivo>")
                 else:
-                    print("Uso: sendfile <nome> <caminho-arquivo>")
+                    print("Uso: sendfile <nome>[@ip:porta][,<nome>...] <caminho-arquivo>")
+            elif cmd == "transfers":
+                self.transfer_manager.report()
+            elif cmd == "pipeline":
+                self.pipeline_report()
+            elif cmd == "stats":
+                self.stats_report()
             else:
                 print("Comando não reconhecido:", cmd)
-                print("Comandos disponíveis: devices, talk, sendfile")
+                print("Comandos disponíveis: devices, talk, sendfile, transfers, pipeline, stats")
 
     def list_devices(self):
         print("=== Dispositivos Ativos ===")
-        now = time.time()
-        for info in self.active_devices.values():
+        now = time.monotonic()
+        for info in self.active_devices.snapshot():
             diff = now - info.last_heartbeat
-            print(f"* {info.name} - {info.ip}:{info.port} (último heartbeat há {int(diff * 1000)} ms)")
+            via = "" if info.direct else ", via gossip"
+            print(f"* {info.name} - {info.ip}:{info.port} (último heartbeat há {int(diff * 1000)} ms{via})")
         print("===========================")
 
-    def send_talk(self, target_name, content):
-        info = self.active_devices.get(target_name)
+    def pipeline_report(self):
+        print("=== Pipeline ===")
+        if not self.workers:
+            print("desligado (use --workers N)")
+        stages = (self.receive_pipeline.stages if self.receive_pipeline else []) + list(self.send_stages)
+        for stage in stages:
+            print(f"* {stage.report()}")
+        print("================")
+
+    def stats_report(self):
+        print("=== Métricas ===")
+        for line in self.metrics.report():
+            print(f"* {line}")
+        print("================")
+
+    def dump_metrics(self):
+        try:
+            self.metrics.dump(self.metrics_file, self.metrics_format)
+        except OSError as e:
+            print(f"[ERRO] Falha ao gravar métricas em {self.metrics_file}: {e}")
+
+    def send_talk(self, target_name, content, on_done=None):
+        # on_done(confirmada) e chamado quando chega o ACK ou quando desiste; retorna o numero da mensagem
+        info = self._find_device(target_name)
         if not info:
-            print("[ERRO] Dispositivo não encontrado:", target_name)
-            return
+            return None
         msg_id = self._generate_message_id()
-        msg = f"TALK {msg_id} {content}"
-        self.pending_messages[msg_id] = PendingMessage(msg_id, msg, info.ip, info.port)
+        msg = f"TALK msg{msg_id} {content}"
+        rtt = self._rtt_estimator(info.ip, info.port)
+        pm = PendingMessage((msg_id, messages.MESSAGE), msg, info.ip, info.port, rtt)
+        pm.on_done = on_done
+        self.pending_messages[pm.id] = pm
         self.send_udp(msg, info.ip, info.port)
+        return msg_id
 
-    def send_file(self, target_name, file_path):
-        info = self.active_devices.get(target_name)
-        if not info:
-            print("[ERRO] Dispositivo não encontrado:", target_name)
-            return
+    def send_file(self, target_name, file_path, chunk_size=None):
+        return self.send_file_multi([target_name], file_path, chunk_size)
+
+    def send_file_multi(self, target_names, file_path, chunk_size=None, pace=None, progress=None):
+        # Envia o mesmo arquivo para varios destinos lendo o arquivo uma vez so: cada CHUNK lido
+        # e codificado para cada destino (msg_id e janela proprios). pace(info, nbytes) e
+        # progress(destino, bytes) sao os ganchos do TransferManager; destino e o texto de target_names
+        # (nome ou nome@ip:porta), como o usuario digitou. Retorna True se todos confirmarem o END.
+        infos = []
+        for target_name in target_names:
+            info = self._find_device(target_name)
+            if not info:
+                return False
+            infos.append(info)
         if not os.path.isfile(file_path):
             print("[ERRO] Arquivo não encontrado:", file_path)
-            return
+            return False
 
-        msg_id = self._generate_message_id()
-        file_name = os.path.basename(file_path)
-        file_size = os.path.getsize(file_path)
-
-        header = f"FILE {msg_id} {file_name} {file_size}"
-        self.pending_messages[msg_id] = PendingMessage(msg_id, header, info.ip, info.port)
-        self.send_udp(header, info.ip, info.port)
-
-        with open(file_path, 'rb') as f:
-            seq = 0
-            while chunk := f.read(1024):
-                seq += 1
-                base64_data = base64.b64encode(chunk).decode('utf-8')
-                chunk_msg = f"CHUNK {msg_id} {seq} {base64_data}"
-                chunk_id = f"{msg_id}-seq{seq}"
-                self.pending_messages[chunk_id] = PendingMessage(chunk_id, chunk_msg, info.ip, info.port)
-                self.send_udp(chunk_msg, info.ip, info.port)
-                print(f"... enviado CHUNK seq={seq} ({len(chunk)} bytes)")
-
-        with open(file_path, 'rb') as f:
-            file_data = f.read()
-        file_hash = hashlib.md5(file_data).hexdigest()
-
-        end_msg = f"END {msg_id} {file_hash}"
-        end_id = f"{msg_id}-end"
-        self.pending_messages[end_id] = PendingMessage(end_id, end_msg, info.ip, info.port)
-        self.send_udp(end_msg, info.ip, info.port)
-        print(f">>> [END enviado] ID={msg_id}")
+        #todos recebem os mesmos CHUNKs: vale o menor tamanho negociado (1024 se houver no legado)
+        sizes = [self._chunk_size_for(info, self._use_binary(info), chunk_size) for info in infos]
+        common_size = CHUNK_SIZE if None in sizes else min(sizes)
+
+        #compressao so com quem recebe binario e anuncia o codec, e se a amostra do arquivo comprimir
+        codecs = [self._codec_for(info) for info in infos]
+        if any(codecs) and not self.compressor.worth_it(file_path, common_size):
+            log.info(f"[INFO] {file_path} não comprime bem, enviando sem compressão")
+            codecs = [None] * len(infos)
+
+        #o hash do END vale para todos: o configurado so se todos entendem digest=, senao md5
+        digest = self.digest if all(info.wire_version >= 2 for info in infos) else "md5"
+
+        #arquivos grandes levam o fid (hash do conteudo): o receptor que ja tem parte dele responde RESUME
+        fid = None
+        if any(size is not None for size in sizes) and os.path.getsize(file_path) >= RESUME_MIN_SIZE:
+            fid = file_id(file_path, digest)
+
+        started = time.monotonic()
+        headers = []
+        targets = {} #numero da mensagem -> destino como veio em target_names
+        for target_name, info, size, codec in zip(target_names, infos, sizes, codecs):
+            msg_id = self._generate_message_id()
+            targets[msg_id] = target_name
+            transfer = FileTransfer(msg_id, file_path, self._use_binary(info), None if size is None else common_size,
+                                    codec, None if size is None else fid, digest, info.wire_version >= 2,
+                                    self.fec if info.wire_version >= 4 else 0)
+            header = transfer.header()
+            rtt = self._rtt_estimator(info.ip, info.port)
+            pm = PendingMessage((msg_id, messages.MESSAGE), header, info.ip, info.port, rtt)
+            answered = threading.Event()
+            pm.on_done = lambda ok, answered=answered: answered.set()
+            self.pending_messages[pm.id] = pm
+            self.send_udp(header, info.ip, info.port)
+            window = SendWindow(msg_id, self.window_size)
+            self.send_windows[msg_id] = window
+            headers.append((info, transfer, rtt, window, pm, answered))
+
+        #com fid espera a resposta ao FILE: ACK manda tudo, RESUME so os intervalos que faltam
+        sessions = []
+        for info, transfer, rtt, window, pm, answered in headers:
+            wanted = None
+            if transfer.fid:
+                answered.wait()
+                if not pm.acknowledged:
+                    window.fail()
+                missing = self.resume_ranges.pop(transfer.msg_id, None)
+                if missing is not None:
+                    wanted = SeqRanges(missing)
+                    log.info(f"[RESUME] {info.name} já tem parte de {file_path}, faltam {sum(end - start + 1 for start, end in missing)} CHUNKs")
+            sessions.append((info, transfer, rtt, window, wanted))
+
+        reader = FileReader(file_path, common_size, digest)
+        #so le do disco o que algum destino precisa
+        ranges = None
+        if all(wanted is not None for *_, wanted in sessions):
+            ranges = [r for *_, wanted in sessions for r in wanted]
+
+        def encode(item):
+            # comprime uma vez e codifica o CHUNK para cada destino que precisa dele
+            seq, chunk = item
+            packed = self.compressor.compress(chunk) if any(codecs) else None
+            return seq, chunk, [transfer.encode_chunk(seq, chunk, packed) if wanted is None or seq in wanted else None
+                                for info, transfer, rtt, window, wanted in sessions]
+
+        #com workers: leitura+md5 numa thread, codificacao no pool e esta thread so envia
+        stage = None
+        if self.workers:
+            stage = pipeline.Stage(f"envio {os.path.basename(file_path)}: codificados", PIPELINE_DEPTH)
+            self.send_stages.append(stage)
+            encoded = pipeline.ordered_map(encode, reader.chunks(ranges), self.workers, stage)
+        else:
+            encoded = map(encode, reader.chunks(ranges))
+
+        #paridade calculada uma vez para todos os destinos com FEC (os retomados recebem so parte dos CHUNKs)
+        encoder = None
+        if any(transfer.fec and wanted is None for info, transfer, rtt, window, wanted in sessions):
+            encoder = ParityEncoder(self.fec, -(-os.path.getsize(file_path) // common_size))
+
+        active = list(sessions)
+        batch = [] #CHUNKs prontos, enviados juntos quando a janela enche ou o lote completa
+        ok = True
+        try:
+            for seq, chunk, per_session in encoded:
+                for session, message in zip(sessions, per_session):
+                    if message is None or session not in active:
+                        continue
+                    info, transfer, rtt, window, wanted = session
+                    if not window.has_room():
+                        self._flush_batch(batch)
+                    if not window.acquire(seq):
+                        active.remove(session)
+                        continue
+                    chunk_id, chunk_msg = message
+                    if pace:
+                        pace(info, len(chunk_msg))
+                    self.pending_messages[chunk_id] = PendingMessage(chunk_id, chunk_msg, info.ip, info.port, rtt)
+                    batch.append((chunk_msg, info.ip, info.port))
+                    if progress:
+                        progress(targets[transfer.msg_id], (seq - 1) * common_size + len(chunk))
+                block = encoder.add(seq, chunk) if encoder else None
+                if block:
+                    for info, transfer, rtt, window, wanted in active:
+                        if transfer.fec and wanted is None:
+                            parity_msg = transfer.encode_parity(*block)
+                            if pace:
+                                pace(info, len(parity_msg))
+                            batch.append((parity_msg, info.ip, info.port))
+                if len(batch) >= SEND_BATCH:
+                    self._flush_batch(batch)
+                if log.level >= log.DEBUG:
+                    print(f"... enviado CHUNK seq={seq} ({len(chunk)} bytes)")
+                if not active:
+                    break
+            self._flush_batch(batch)
+
+            ends = []
+            for info, transfer, rtt, window, wanted in sessions:
+                if not window.wait_drained():
+                    self._abort_transfer(window)
+                    self.metrics.inc("transfers", "falha")
+                    ok = False
+                    continue
+                end_id, end_msg = transfer.end_message(fid if ranges is not None else reader.hexdigest())
+                pm = PendingMessage(end_id, end_msg, info.ip, info.port, rtt)
+                answered = threading.Event()
+                pm.on_done = lambda ok, answered=answered: answered.set()
+                self.pending_messages[end_id] = pm
+                self.send_udp(end_msg, info.ip, info.port)
+                log.info(f">>> [END enviado] ID={transfer.msg_text}")
+                ends.append((transfer, pm, answered))
+
+            #so conta como enviado quando o receptor confirma o END (hash conferido); NACK ou
+            #tentativas esgotadas sao falha
+            for transfer, pm, answered in ends:
+                answered.wait()
+                if not pm.acknowledged:
+                    self.metrics.inc("transfers", "falha")
+                    ok = False
+                    continue
+                self.metrics.inc("transfers", "ok")
+                self.metrics.observe("transfer_mb_per_s", transfer.file_size / 1024 / 1024 / max(time.monotonic() - started, 1e-6))
+        finally:
+            for info, transfer, rtt, window, wanted in sessions:
+                del self.send_windows[transfer.msg_id]
+            if stage:
+                encoded.close()
+                self.send_stages.remove(stage)
+        return ok
+
+    def _flush_batch(self, batch):
+        if batch:
+            self.send_batch([(msg.encode('utf-8') if isinstance(msg, str) else msg, ip, port) for msg, ip, port in batch])
+            batch.clear()
+
+    def _abort_transfer(self, window):
+        #algum CHUNK estourou o orçamento de tentativas: descarta o resto da janela
+        for seq in list(window.in_flight):
+            self.pending_messages.pop((window.msg_id, seq), None)
+        print(f"[ERRO] Transferência ID=msg{window.msg_id} abortada")
 
     def _schedule(self, func, interval):
         def wrapper():
@@ -169,10 +476,47 @@ class UdpNode:
                 time.sleep(interval)
         threading.Thread(target=wrapper, daemon=True).start()
 
+    def _find_device(self, target_name):
+        # nome ou nome@ip:porta; com o nome repetido em mais de um endereco pede o endereco
+        matches = self.active_devices.find(target_name)
+        if len(matches) == 1:
+            return matches[0]
+        if matches:
+            print(f"[ERRO] Há {len(matches)} dispositivos chamados {target_name}, use um de:",
+                  ", ".join(info.label() for info in matches))
+        else:
+            print("[ERRO] Dispositivo não encontrado:", target_name)
+        return None
+
+    def _use_binary(self, info):
+        #nos antigos (sem wire=) recebem CHUNK em texto base64; conferido com benchmarks/check_legacy.py
+        return self.wire_format == "binary" and info.wire_version >= 1
+
+    def _codec_for(self, info):
+        if self.compressor and self._use_binary(info) and self.compressor.codec in info.codecs:
+            return self.compressor.codec
+        return None
+
+    def _chunk_size_for(self, info, binary, requested=None):
+        # None = formato legado (1024 fixo, sem chunk= no FILE)
+        if info.wire_version < 1:
+            return None
+        if requested:
+            return requested
+        mtu = self.mtu or self.path_mtus.get(info.ip)
+        if mtu is None:
+            mtu = self.path_mtus[info.ip] = path_mtu.probe_path_mtu(info.ip, info.port)
+        return path_mtu.chunk_size_for_mtu(mtu, binary)
+
+    def _rtt_estimator(self, ip, port):
+        return self.rtt_estimators.setdefault((ip, port), RttEstimator())
+
     def _generate_message_id(self):
         global message_counter
-        message_counter += 1
-        return f"msg{message_counter}"
+        # numero da mensagem: no texto vai como msg<N>, no binario e nas chaves de pendentes so o N
+        with message_counter_lock: #varias transferencias podem rodar em paralelo
+            message_counter += 1
+            return message_counter
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="UDP Node")
@@ -180,8 +524,33 @@ if __name__ == '__main__':
     parser.add_argument("--listen-port", type=int, default=11000, help="Porta de escuta")
     parser.add_argument("--dest-port", type=int, default=11000, help="Porta de destino")
     parser.add_argument("--dest-ip", default="255.255.255.255", help="Endereço IP de destino")
+    parser.add_argument("--window", type=int, default=WINDOW_SIZE, help="Tamanho da janela de envio (CHUNKs em voo)")
+    parser.add_argument("--wire", choices=["binary", "text"], default="binary", help="Formato dos CHUNKs (binary só é usado com quem anunciar suporte)")
+    parser.add_argument("--mtu", type=int, help="MTU do caminho (padrão: descobre por destino; ex. 9000 para jumbo frames)")
+    parser.add_argument("--max-transfers", type=int, default=4, help="Transferências de arquivo simultâneas")
+    parser.add_argument("--rate-limit", type=int, default=0, help="Limite total de envio em bytes/s (0 = sem limite)")
+    parser.add_argument("--peer-rate", type=int, default=0, help="Limite de envio por destino em bytes/s (0 = sem limite)")
+    parser.add_argument("--compress", choices=compression.SUPPORTED, help="Comprime os CHUNKs de arquivo (só com quem anunciar suporte)")
+    parser.add_argument("--compress-level", type=int, help="Nível de compressão (padrão: zlib 1, lzma 1)")
+    parser.add_argument("--workers", type=int, default=0, help="Threads de codificação/decodificação (0 = tudo na thread do socket)")
+    parser.add_argument("--digest", choices=DIGESTS, default="sha256", help="Hash do arquivo no END (nós antigos recebem md5)")
+    parser.add_argument("--verbosity", type=int, choices=[log.ERROR, log.INFO, log.DEBUG], default=log.INFO, help="0 = só erros, 1 = eventos, 2 = cada pacote")
+    parser.add_argument("--metrics-file", help=f"Grava as métricas neste arquivo a cada {METRICS_INTERVAL} s")
+    parser.add_argument("--seed", action="append", default=[], help="ip:porta de um nó para entrar na rede por gossip, mesmo fora do alcance do broadcast (pode repetir)")
+    parser.add_argument("--fec", type=int, default=0, help="Manda um PARITY (XOR) a cada N CHUNKs de arquivo: recupera uma perda por bloco sem esperar o reenvio (0 = desligado)")
+    parser.add_argument("--metrics-format", choices=["json", "prometheus"], default="json", help="Formato do --metrics-file")
     args = parser.parse_args()
+    try:
+        seeds = [parse_address(seed) for seed in args.seed]
+    except (ValueError, OSError) as e:
+        parser.error(f"--seed: {e}")
+
+    log.set_level(args.verbosity)
 
-node = UdpNode(args.name, args.listen_port, args.dest_ip, args.dest_port)
-node.start(args.dest_ip , args.listen_port)
+    node = UdpNode(args.name, args.listen_port, args.dest_ip, args.dest_port, window_size=args.window, wire_format=args.wire,
+                   mtu=args.mtu, max_transfers=args.max_transfers, global_rate=args.rate_limit, peer_rate=args.peer_rate,
+                   compression_codec=args.compress, compression_level=args.compress_level, workers=args.workers,
+                   digest=args.digest, metrics_file=args.metrics_file, metrics_format=args.metrics_format, fec=args.fec,
+                   seeds=seeds)
+    node.start(args.dest_ip , args.listen_port)
 
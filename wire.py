@@ -0,0 +1,77 @@
+import struct
+import zlib
+
+# Formato binario das mensagens de dados. Convive com o formato texto antigo:
+# mensagens texto sempre comecam com uma letra ASCII, as binarias com MAGIC.
+MAGIC = 0xB7
+# Versao do cabecalho binario. Na 1 o crc32 cobre so o payload; na 2 cobre o cabecalho tambem
+# (um seq corrompido gravaria o CHUNK no lugar errado). A 1 continua indo para nos wire=1
+FRAME_VERSION = 2
+FRAME_VERSIONS = (1, 2)
+# Nivel anunciado no HEARTBEAT (wire=): 1 = CHUNKs binarios e opcoes no FILE (chunk=, comp=, fid=);
+# 2 = crc= nos CHUNKs texto, NACK por CHUNK corrompido e digest= no FILE; 3 = SACK com mapa de bits (m=);
+# 4 = PARITY (FEC, fec= no FILE); 5 = gossip de dispositivos (v= e peers= no HEARTBEAT)
+WIRE_VERSION = 5
+
+TYPE_CHUNK = 1
+TYPE_PARITY = 2  #XOR dos CHUNKs de um bloco (fec.py); seq = primeiro seq do bloco
+
+FLAG_COMPRESSED = 0x01  #payload comprimido com o codec anunciado no FILE (comp=)
+
+# magic, versao, tipo, flags, msg_id, seq, tamanho do payload, crc32
+HEADER = struct.Struct("!BBBBIIII")
+
+
+class WireError(ValueError):
+    pass
+
+
+class ChecksumError(WireError):
+    # crc nao bate: o tipo, msg_id e seq dizem qual CHUNK pedir de novo (na versao 2 podem ser
+    # eles os corrompidos; ai o pedido cai num CHUNK que nao estava faltando e so gera um reenvio a mais)
+    def __init__(self, msg_type, msg_id, seq):
+        super().__init__("checksum invalido")
+        self.msg_type = msg_type
+        self.msg_id = msg_id
+        self.seq = seq
+
+
+def is_binary(data):
+    return len(data) > 0 and data[0] == MAGIC
+
+
+def _checksum(version, fields, payload):
+    if version == 1:
+        return zlib.crc32(payload)
+    return zlib.crc32(payload, zlib.crc32(fields))
+
+
+def encode(msg_type, msg_id, seq, payload, flags=0, version=FRAME_VERSION):
+    # msg_id e o numero da mensagem (o "msg<N>" do formato texto vira so o N)
+    fields = HEADER.pack(MAGIC, version, msg_type, flags, msg_id, seq, len(payload), 0)[:-4]
+    return fields + struct.pack("!I", _checksum(version, fields, payload)) + payload
+
+
+def decode(data):
+    # retorna (tipo, flags, numero da mensagem, seq, payload); payload e uma fatia sem decodificar
+    if len(data) < HEADER.size:
+        raise WireError("mensagem binaria truncada")
+    magic, version, msg_type, flags, msg_id, seq, length, checksum = HEADER.unpack_from(data)
+    if magic != MAGIC or version not in FRAME_VERSIONS:
+        raise WireError(f"versao de protocolo nao suportada: {version}")
+    payload = data[HEADER.size:HEADER.size + length]
+    if len(payload) != length:
+        raise WireError("payload truncado")
+    if _checksum(version, data[:HEADER.size - 4], payload) != checksum:
+        raise ChecksumError(msg_type, msg_id, seq)
+    return msg_type, flags, msg_id, seq, payload
+
+
+def text_chunk_crc(msg_text, seq, chunk):
+    # crc= dos CHUNKs texto: cobre o id ("msg<N>") e o seq junto com os dados, como o cabecalho binario versao 2
+    return zlib.crc32(chunk, zlib.crc32(f"{msg_text} {seq}".encode()))
+
+
+def parse_options(tokens):
+    # opcoes "chave=valor" anunciadas no fim de mensagens texto (ex.: HEARTBEAT nome wire=1)
+    return dict(token.split("=", 1) for token in tokens if "=" in token)